@@ -5,19 +5,25 @@ import json
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-import psutil
 
+from .ml_scoring import ModelScorer
 from .reporting import generate_report
-from .simulation_engine import AttackRequest, AttackSimulationEngine
-from .telemetry import RuntimeState, TelemetryHub
+from .security_utils import appenders, pseudonymizer
+from .segments import segment_store
+from .simulation_engine import ALERT_FILE, EVENT_FILE, AttackRequest, AttackSimulationEngine, LoadRequest
+from .system_metrics import SystemSampler
+from .telemetry import MITRE_TECHNIQUES, RuntimeState, TelemetryHub
 
 app = FastAPI(title="ShadowHunt API", version="1.0.0")
 
 PROFILES = ["low", "medium", "high"]
+WS_HEARTBEAT_SECONDS = 5.0
 
 state = RuntimeState()
 telemetry = TelemetryHub(state)
-engine = AttackSimulationEngine(state, telemetry)
+scorer = ModelScorer()
+sampler = SystemSampler()
+engine = AttackSimulationEngine(state, telemetry, scorer)
 
 
 class SimRequest(BaseModel):
@@ -32,6 +38,22 @@ class ChainRequest(BaseModel):
     evasion: bool = False
 
 
+class LoadStartRequest(BaseModel):
+    rate: float = 0.0
+    duration: float = 30.0
+    batch_size: int = 500
+    include_noise: bool = True
+    evasion: bool = False
+    workers: int = 1
+
+
+class CampaignRequest(BaseModel):
+    chains: int = 4
+    profiles: list[str] = PROFILES
+    include_noise: bool = True
+    evasion_rate: float = 0.3
+
+
 class ToggleRequest(BaseModel):
     enabled: bool = True
 
@@ -42,6 +64,16 @@ async def startup() -> None:
     Path("/data/events").mkdir(parents=True, exist_ok=True)
     Path("/data/alerts").mkdir(parents=True, exist_ok=True)
     Path("/data/reports").mkdir(parents=True, exist_ok=True)
+    scorer.start()
+    sampler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    engine.close()
+    scorer.stop()
+    sampler.stop()
+    appenders.shutdown()
 
 
 @app.get("/")
@@ -55,13 +87,12 @@ def profiles():
 
 
 @app.post("/start_sim")
-def start_sim(req: SimRequest):
-    return engine.trigger_attack(AttackRequest(technique=req.technique, evasion=req.evasion, count=req.count))
-
-
 @app.post("/trigger_attack")
 def trigger_attack(req: SimRequest):
-    return engine.trigger_attack(AttackRequest(technique=req.technique, evasion=req.evasion, count=req.count))
+    job = engine.trigger_attack(AttackRequest(technique=req.technique, evasion=req.evasion, count=req.count))
+    if job is None:
+        return {"ok": False, "error": "Too many attack jobs in progress"}
+    return {"ok": True, **job.to_dict(), "attack_id": job.params.get("attack_id")}
 
 
 @app.post("/start_chain")
@@ -69,18 +100,52 @@ def trigger_attack(req: SimRequest):
 def start_chain(req: ChainRequest):
     if req.profile not in PROFILES:
         return {"ok": False, "error": "Unsupported profile"}
-    started = engine.start_chain(req.profile, req.include_noise, req.evasion)
-    if not started:
-        return {"ok": False, "error": "Simulation already running"}
+    job = engine.start_chain(req.profile, req.include_noise, req.evasion)
+    if job is None:
+        return {"ok": False, "error": "Too many attack jobs in progress"}
     return {
         "ok": True,
         "started": "attack_chain",
+        "job_id": job.id,
+        "attack_id": job.params["attack_id"],
         "profile": req.profile,
         "noise": req.include_noise,
         "evasion": req.evasion,
     }
 
 
+@app.post("/start_campaign")
+def start_campaign(req: CampaignRequest):
+    if req.chains < 1 or not req.profiles or any(p not in PROFILES for p in req.profiles):
+        return {"ok": False, "error": "chains must be >= 1 and profiles a non-empty subset of low/medium/high"}
+    jobs = engine.start_campaign(req.chains, req.profiles, req.include_noise, req.evasion_rate)
+    if not jobs:
+        return {"ok": False, "error": "Too many attack jobs in progress"}
+    return {"ok": True, "started": len(jobs), "requested": req.chains, "jobs": [j.to_dict() for j in jobs]}
+
+
+@app.get("/jobs")
+def list_jobs():
+    jobs = engine.list_jobs()
+    return {"jobs": [j.to_dict() for j in reversed(jobs)], "active": sum(j.active for j in jobs)}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = engine.get_job(job_id)
+    if job is None:
+        return {"ok": False, "error": "Unknown job"}
+    return {"ok": True, **job.to_dict()}
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = engine.cancel_job(job_id)
+    if job is None:
+        return {"ok": False, "error": "Unknown job"}
+    return {"ok": True, **job.to_dict()}
+
+
 @app.post("/stop_sim")
 @app.post("/stop_simulation")
 def stop_sim():
@@ -88,20 +153,38 @@ def stop_sim():
     return {"ok": True, "stopped": True}
 
 
+@app.post("/load/start")
+def start_load(req: LoadStartRequest):
+    if req.rate < 0 or req.duration < 0 or req.batch_size < 1 or req.workers < 1:
+        return {"ok": False, "error": "rate and duration must be >= 0, batch_size and workers >= 1"}
+    if not engine.start_load(LoadRequest(**req.model_dump())):
+        return {"ok": False, "error": "Load generator already running"}
+    return {"ok": True, "started": "load", "load": engine.load_status()}
+
+
+@app.post("/load/stop")
+def stop_load():
+    engine.stop_load()
+    return {"ok": True, "load": engine.load_status()}
+
+
+@app.get("/load/status")
+def load_status():
+    return engine.load_status()
+
+
 @app.post("/detection/mode/{mode}")
 def set_detection_mode(mode: str):
     if mode not in ["legacy", "hardened"]:
         return {"ok": False, "error": "mode must be legacy or hardened"}
-    with state.lock:
-        state.mode = mode
-    telemetry.publish({"kind": "mode_change", "mode": mode, "snapshot": state.snapshot()})
+    state.configure(mode=mode)
+    telemetry.publish({"kind": "mode_change", "mode": mode, "counters": state.counters()})
     return {"ok": True, "mode": mode}
 
 
 @app.post("/privacy/anonymize")
 def set_anonymize(req: ToggleRequest):
-    with state.lock:
-        state.anonymize_logs = req.enabled
+    state.configure(anonymize_logs=req.enabled)
     return {"ok": True, "anonymize_logs": state.anonymize_logs}
 
 
@@ -109,35 +192,77 @@ def set_anonymize(req: ToggleRequest):
 def reset_lab():
     engine.stop()
     state.clear()
-    for p in Path("/data/events").glob("*.jsonl"):
-        p.unlink(missing_ok=True)
-    for p in Path("/data/alerts").glob("*.jsonl"):
-        p.unlink(missing_ok=True)
+    appenders.close()
+    segment_store(Path("/data/events")).purge()
+    segment_store(Path("/data/alerts")).purge()
     return {"ok": True}
 
 
+MAX_PAGE = 1000
+
+
+def page(buffer, filters: dict[str, str | None], cursor: int | None, limit: int, since: str | None) -> tuple[list, int | None]:
+    active = {k: v for k, v in filters.items() if v is not None}
+    return buffer.query(active, cursor, max(1, min(limit, MAX_PAGE)), since)
+
+
+@app.get("/alerts")
 @app.get("/detect")
 @app.get("/get_alerts")
-def detect():
-    return {"alerts": state.snapshot()["alerts"]}
+def detect(
+    technique: str | None = None,
+    detector: str | None = None,
+    attack_id: str | None = None,
+    severity: str | None = None,
+    bucket: str | None = None,
+    since: str | None = None,
+    cursor: int | None = None,
+    limit: int = 300,
+):
+    """Newest alerts matching the filters, oldest-first; pass ``next_cursor`` back as ``cursor`` for older ones."""
+    filters = {"technique": technique, "detector": detector, "attack_id": attack_id, "severity": severity, "bucket": bucket}
+    alerts, next_cursor = page(state.alerts, filters, cursor, limit, since)
+    return {"alerts": alerts, "next_cursor": next_cursor}
+
+
+@app.get("/events")
+def events(
+    technique: str | None = None,
+    attack_id: str | None = None,
+    event_type: str | None = None,
+    bucket: str | None = None,
+    since: str | None = None,
+    cursor: int | None = None,
+    limit: int = 300,
+):
+    filters = {"technique": technique, "attack_id": attack_id, "event_type": event_type, "bucket": bucket}
+    rows, next_cursor = page(state.replay_events, filters, cursor, limit, since)
+    return {"events": rows, "next_cursor": next_cursor}
+
+
+@app.get("/alerts/facets/{field}")
+def alert_facets(field: str):
+    if field not in state.alerts.indexes:
+        return {"ok": False, "error": f"field must be one of {', '.join(state.alerts.indexes)}"}
+    return {"field": field, "counts": state.alerts.facets(field)}
+
+
+@app.get("/events/facets/{field}")
+def event_facets(field: str):
+    if field not in state.replay_events.indexes:
+        return {"ok": False, "error": f"field must be one of {', '.join(state.replay_events.indexes)}"}
+    return {"field": field, "counts": state.replay_events.facets(field)}
 
 
 @app.get("/coverage")
 def coverage():
-    snap = state.snapshot()
-    executed = sum(snap["mitre_coverage"].values())
-    detected = sum(1 for a in snap["alerts"] if a.get("detected"))
+    # Tallies are kept per technique as events are processed, so this covers the full history.
+    stats = state.technique_stats()
+    counts = state.counters()
+    executed = sum(stats[t]["executed"] for t in MITRE_TECHNIQUES)
+    detected = counts["detected_alerts"]
     coverage_score = round((detected / executed) * 100, 2) if executed else 0.0
-    summary = [
-        {
-            "technique": k,
-            "executed": v,
-            "detected": sum(
-                1 for a in snap["alerts"] if a.get("technique") == k and a.get("detected")
-            ),
-        }
-        for k, v in snap["mitre_coverage"].items()
-    ]
+    summary = [{"technique": t, **stats[t]} for t in MITRE_TECHNIQUES]
     return {
         "coverage_score": coverage_score,
         "summary": summary,
@@ -145,20 +270,16 @@ def coverage():
         "totals": {
             "executed": executed,
             "detected": detected,
-            "false_positives": snap["false_positives"],
+            "false_positives": counts["false_positives"],
         },
-        "detection_mode": snap["mode"],
+        "detection_mode": counts["mode"],
     }
 
 
 @app.get("/report")
 def report():
-    snap = state.snapshot()
-    counts = {}
-    for event in snap["attack_timeline"]:
-        technique = event.get("technique", "N/A")
-        counts[technique] = counts.get(technique, 0) + 1
-    return {"event_counts": counts}
+    stats = state.technique_stats()
+    return {"event_counts": {t: row["executed"] for t, row in stats.items() if row["executed"]}}
 
 
 @app.get("/generate_report")
@@ -167,54 +288,90 @@ def get_generate_report():
 
 
 @app.get("/replay")
-def replay():
-    return {"events": state.snapshot()["replay_events"]}
+def replay(offset: int | None = None, limit: int = 500, start: str | None = None, end: str | None = None):
+    """In-memory replay history, or with ``start``/``end`` (ISO ts) the on-disk event segments in that window."""
+    if start is not None or end is not None:
+        events = segment_store(EVENT_FILE.parent).read(EVENT_FILE.stem, start, end, min(limit, 5000))
+        return {"events": events, "start": start, "end": end}
+    if offset is None:
+        return {"events": state.snapshot()["replay_events"]}
+    offset = max(offset, state.replay_events.oldest)  # older spilled records have been dropped
+    events = state.replay_events.read(offset, min(limit, 5000))
+    total = state.replay_events.total
+    return {"events": events, "offset": offset, "total": total}
 
 
 @app.get("/get_metrics")
 @app.get("/system/metrics")
-def system_metrics():
-    disk = psutil.disk_usage("/")
-    mem = psutil.virtual_memory()
-    cpu = psutil.cpu_percent(interval=0.2)
-    snap = state.snapshot()
-    return {
+def system_metrics(window: float | None = None):
+    """Latest host sample plus simulation rates; ``window`` (seconds) adds the recent series and its averages."""
+    sample = sampler.latest()
+    counts = state.counters()
+    latest_ml = state.ml_confidence.tail(1)
+    out = {
+        **{k: v for k, v in sample.items() if k not in ("ts", "epoch")},
         "ts": datetime.now(timezone.utc).isoformat(),
-        "cpu_percent": cpu,
-        "memory_percent": mem.percent,
-        "memory_used_mb": round(mem.used / (1024 * 1024), 2),
-        "memory_total_mb": round(mem.total / (1024 * 1024), 2),
-        "disk_percent": disk.percent,
-        "disk_used_gb": round(disk.used / (1024 * 1024 * 1024), 2),
-        "disk_total_gb": round(disk.total / (1024 * 1024 * 1024), 2),
-        "network_mbps": round(psutil.net_io_counters().bytes_sent / (1024 * 1024), 2),
-        "pcap_enabled": snap["pcap_enabled"],
-        "running": snap["running"],
-        "false_positive_rate": round((snap["false_positives"] / max(snap["alert_count"], 1)) * 100, 2),
-        "ml_anomaly_latest": snap["ml_confidence"][-1]["confidence"] if snap["ml_confidence"] else 0.0,
-        "evasion_success_rate": round((snap["evasion_success"] / max(snap["evasion_attempts"], 1)) * 100, 2),
+        "sampled_at": sample["ts"],
+        "pcap_enabled": state.pcap_enabled,
+        "running": counts["running"],
+        "false_positive_rate": round((counts["false_positives"] / max(counts["alert_count"], 1)) * 100, 2),
+        "ml_anomaly_latest": latest_ml[0]["confidence"] if latest_ml else 0.0,
+        "evasion_success_rate": round((counts["evasion_success"] / max(counts["evasion_attempts"], 1)) * 100, 2),
     }
+    if window:
+        series = sampler.window(min(window, sampler.interval * sampler.samples.capacity))
+        keys = ("cpu_percent", "memory_percent", "network_mbps")
+        out["window"] = {
+            "seconds": window,
+            "samples": series,
+            "avg": {k: round(sum(s[k] for s in series) / len(series), 3) if series else 0.0 for k in keys},
+            "max": {k: max((s[k] for s in series), default=0.0) for k in keys},
+        }
+    return out
 
 
 @app.get("/system/status")
 def system_status():
-    snap = state.snapshot()
     return {
         "event_files": len(list(Path("/data/events").glob("*.jsonl"))),
         "alert_files": len(list(Path("/data/alerts").glob("*.jsonl"))),
-        "model_present": True,
-        "detection_mode": snap["mode"],
-        "running": snap["running"],
+        "model_present": scorer.available,
+        "ml_scorer": scorer.stats(),
+        "appenders": appenders.stats(),
+        "pseudonym_cache": pseudonymizer.stats(),
+        "segments": {
+            "events": segment_store(EVENT_FILE.parent).stats(),
+            "alerts": segment_store(ALERT_FILE.parent).stats(),
+        },
+        "detection_mode": state.mode,
+        "running": state.running,
     }
 
 
+@app.get("/telemetry/stats")
+def telemetry_stats():
+    return telemetry.stats()
+
+
+@app.get("/system/locks")
+def lock_stats():
+    return {"state": state.lock_stats(), "telemetry": telemetry.stats()["lock"]}
+
+
 @app.websocket("/ws/telemetry")
 async def ws_telemetry(ws: WebSocket):
     await telemetry.connect(ws)
     try:
         while True:
-            await ws.send_json({"kind": "snapshot", "snapshot": state.snapshot()})
-            await asyncio.sleep(1.0)
+            try:
+                msg = await asyncio.wait_for(ws.receive_json(), timeout=WS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                telemetry.heartbeat(ws)
+                continue
+            if msg.get("op") == "resync":
+                telemetry.resync(ws, msg.get("since"))
+            elif msg.get("op") == "snapshot":
+                telemetry.send_snapshot(ws)
     except WebSocketDisconnect:
         telemetry.disconnect(ws)
     except Exception:
@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any
+
+try:
+    import joblib
+    import numpy as np
+except ImportError:  # scoring falls back to the simulated confidence
+    joblib = None
+    np = None
+
+
+MODEL_PATH = Path("/data/models/iforest.joblib")
+
+# Must match detection/ml/features.py, which trains the model.
+FEATURES = ["is_fail", "proto_smb", "proto_rdp", "is_attack", "is_noise", "is_encoded"]
+
+
+def encode_features(events: list[dict[str, Any]]):
+    X = np.zeros((len(events), len(FEATURES)), dtype=np.float32)
+    for i, e in enumerate(events):
+        proto = e.get("proto")
+        etype = e.get("event_type")
+        X[i] = (
+            e.get("result") == "failure",
+            proto == "smb",
+            proto == "rdp",
+            etype == "attack_step",
+            etype == "noise",
+            e.get("marker_encoding", "plain") != "plain",
+        )
+    return X
+
+
+class ModelScorer:
+    """Scores events with the detector's IsolationForest in micro-batches on a worker thread.
+
+    The model is loaded once and reloaded whenever the file's mtime changes. Requests
+    are grouped until ``max_batch`` events are queued or ``max_delay`` seconds have
+    passed since the first one, and each group costs a single model call.
+    """
+
+    def __init__(self, model_path: Path = MODEL_PATH, max_batch: int = 256, max_delay: float = 0.005):
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.model = None
+        self.model_mtime: int | None = None
+        self.queue: queue.Queue[tuple[dict[str, Any], Future]] = queue.Queue()
+        self.worker: threading.Thread | None = None
+        self.stop_event = threading.Event()
+        self.batches = 0
+        self.scored = 0
+        self.reloads = 0
+
+    @property
+    def available(self) -> bool:
+        return joblib is not None and self.model_path.exists()
+
+    def start(self) -> None:
+        if joblib is None or (self.worker and self.worker.is_alive()):
+            return
+        self.stop_event.clear()
+        self.worker = threading.Thread(target=self._run, name="ml-scorer", daemon=True)
+        self.worker.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.worker and self.worker.is_alive():
+            self.worker.join(timeout=2.0)
+
+    def submit(self, event: dict[str, Any]) -> Future:
+        fut: Future = Future()
+        self.queue.put((event, fut))
+        return fut
+
+    def score_many(self, events: list[dict[str, Any]], timeout: float = 1.0) -> list[tuple[float, bool]] | None:
+        """Return ``(anomaly_score, is_anomaly)`` per event, or None when no model is available."""
+        if not events or not self.available or not (self.worker and self.worker.is_alive()):
+            return None
+        futures = [self.submit(e) for e in events]
+        try:
+            return [f.result(timeout=timeout) for f in futures]
+        except Exception:
+            return None
+
+    def score(self, event: dict[str, Any], timeout: float = 1.0) -> tuple[float, bool] | None:
+        results = self.score_many([event], timeout)
+        return results[0] if results else None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "available": self.available,
+            "model_loaded": self.model is not None,
+            "model_mtime": self.model_mtime,
+            "reloads": self.reloads,
+            "batches": self.batches,
+            "scored": self.scored,
+            "avg_batch": round(self.scored / self.batches, 2) if self.batches else 0.0,
+            "queue_depth": self.queue.qsize(),
+        }
+
+    def _load_model(self):
+        mtime = os.stat(self.model_path).st_mtime_ns
+        if mtime != self.model_mtime:
+            self.model = joblib.load(self.model_path)
+            self.model_mtime = mtime
+            self.reloads += 1
+        return self.model
+
+    def _next_batch(self) -> list[tuple[dict[str, Any], Future]]:
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        if self.model_path.exists():
+            try:
+                self._load_model()  # warm up so the first request does not pay for unpickling
+            except Exception:
+                pass
+        while not self.stop_event.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                model = self._load_model()
+                X = encode_features([e for e, _ in batch])
+                # One pass over the forest: predict() is ``score_samples(X) - offset_ < 0`` recomputed.
+                raw = model.score_samples(X)
+                anomalous = raw < model.offset_
+            except Exception as exc:
+                for _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+            self.batches += 1
+            self.scored += len(batch)
+            for (_, fut), s, anomaly in zip(batch, raw, anomalous):
+                fut.set_result((round(float(-s), 3), bool(anomaly)))
@@ -53,6 +53,7 @@ def generate_report(state: RuntimeState) -> dict[str, Any]:
             "evasion_success": snap["evasion_success"],
         },
         "mitre_coverage": snap["mitre_coverage"],
+        "technique_stats": state.technique_stats(),
         "ml_confidence_recent": snap["ml_confidence"][-20:],
         "alerts_recent": snap["alerts"][-30:],
     }
@@ -1,17 +1,89 @@
 import hashlib
-import json
+import hmac
+import os
 import random
+import threading
+import time
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
+from .segments import SEGMENT_MAX_BYTES, SEGMENT_MAX_SECONDS, maintain_all, segment_store
+from .serialization import dumps_line
+
+
+PII_KEYS = ("src_ip", "dst_ip", "username", "host", "target_host")
+
+# Appended lines are buffered per file and written out once FLUSH_BYTES are pending or
+# the oldest pending line is FLUSH_SECONDS old. APPEND_FSYNC is "close" (fsync when an
+# appender is closed, e.g. on shutdown), "flush" (after every write) or "never".
+FLUSH_BYTES = int(os.getenv("APPEND_FLUSH_BYTES", str(256 * 1024)))
+FLUSH_SECONDS = float(os.getenv("APPEND_FLUSH_SECONDS", "0.2"))
+FSYNC_POLICY = os.getenv("APPEND_FSYNC", "close")
+# How often the flusher thread checks time-based rotation, compression and retention.
+MAINTAIN_SECONDS = 30.0
+
 
 def utc_ts() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+class Pseudonymizer:
+    """Keyed-hash pseudonyms with a bounded LRU cache.
+
+    With a salt, tokens are HMAC-SHA256 so labs configured with different secrets
+    produce unlinkable pseudonyms; without one they are plain SHA-256 prefixes.
+    The detector's privacy/pseudonymize.py implements the same scheme.
+    """
+
+    def __init__(self, salt: str = "", length: int = 16, cache_size: int = 4096):
+        self.key = salt.encode("utf-8")
+        self.length = length
+        self._token = lru_cache(maxsize=cache_size)(self._digest)
+
+    def _digest(self, value: str) -> str:
+        raw = value.encode("utf-8")
+        if self.key:
+            return hmac.new(self.key, raw, hashlib.sha256).hexdigest()[: self.length]
+        return hashlib.sha256(raw).hexdigest()[: self.length]
+
+    def token(self, value: str) -> str:
+        return self._token(value)
+
+    def anonymize_records(self, records: list[dict[str, Any]], keys=PII_KEYS) -> list[dict[str, Any]]:
+        """Return pseudonymized copies of ``records``, hashing each distinct value once per batch."""
+        table = {str(r[k]): None for r in records for k in keys if r.get(k)}
+        for value in table:
+            table[value] = self.token(value)
+        out = []
+        for r in records:
+            clone = dict(r)
+            for k in keys:
+                value = clone.get(k)
+                if value:
+                    clone[k] = table[str(value)]
+            out.append(clone)
+        return out
+
+    def stats(self) -> dict[str, Any]:
+        info = self._token.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+            "keyed": bool(self.key),
+        }
+
+
+pseudonymizer = Pseudonymizer(os.getenv("PSEUDONYM_SALT", ""))
+
+
 def hash_value(value: str) -> str:
-    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+    return pseudonymizer.token(value)
 
 
 def maybe(probability: float) -> bool:
@@ -21,18 +93,198 @@ def maybe(probability: float) -> bool:
 def anonymize_event(event: dict[str, Any], enabled: bool) -> dict[str, Any]:
     if not enabled:
         return dict(event)
-    clone = dict(event)
-    for pii_key in ("src_ip", "dst_ip", "username", "host", "target_host"):
-        value = clone.get(pii_key)
-        if value:
-            clone[pii_key] = hash_value(str(value))
-    return clone
-
-
-def write_jsonl(path: Path, row: dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row) + "\n")
+    return pseudonymizer.anonymize_records([event])[0]
+
+
+def anonymize_events(events: list[dict[str, Any]], enabled: bool) -> list[dict[str, Any]]:
+    if not enabled:
+        return [dict(e) for e in events]
+    return pseudonymizer.anonymize_records(events)
+
+
+class JsonlAppender:
+    """Long-lived, buffered appender for one JSONL file.
+
+    Only whole lines are ever buffered, and a flush hands the whole buffer to a single
+    O_APPEND write loop under the lock, so readers tailing the file never see a line
+    interleaved with another writer's and at most a trailing partial line mid-write.
+    Once the file reaches SEGMENT_MAX_BYTES or SEGMENT_MAX_SECONDS of writes it is
+    sealed into a segment (see ``segments``) and the next flush starts a fresh file.
+    """
+
+    def __init__(self, path: Path, flush_bytes: int = FLUSH_BYTES, flush_seconds: float = FLUSH_SECONDS, fsync: str = FSYNC_POLICY):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.fd: int | None = None
+        self.pending: list[bytes] = []
+        self.pending_bytes = 0
+        self.first_pending = 0.0
+        self.closed = False
+        self.lines = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.segments = segment_store(path.parent)
+        self.size = 0
+        self.active_since = 0.0
+        self.rotations = 0
+
+    def write(self, data: bytes) -> None:
+        """Queue ``data``, which must consist of complete newline-terminated lines."""
+        with self.lock:
+            if not self.pending:
+                self.first_pending = time.monotonic()
+            self.pending.append(data)
+            self.pending_bytes += len(data)
+            self.lines += data.count(b"\n")
+            if self.closed:
+                # A writer still holding this appender after the pool was closed: write
+                # through rather than leave lines in a buffer nobody will flush.
+                self._flush()
+                self._close_fd()
+            elif self.pending_bytes >= self.flush_bytes:
+                self._flush()
+
+    def flush(self, force: bool = False) -> None:
+        with self.lock:
+            if self.pending and (force or time.monotonic() - self.first_pending >= self.flush_seconds):
+                self._flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self._flush()
+            self._close_fd()
+
+    def rotate_if_due(self) -> None:
+        """Seal a file that has reached its age limit even if no write arrives to trigger it."""
+        with self.lock:
+            if self.fd is not None and self._rotation_due():
+                self._flush()
+                if self.fd is not None:
+                    self._rotate()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "open": self.fd is not None,
+            "lines": self.lines,
+            "flushes": self.flushes,
+            "bytes_written": self.bytes_written,
+            "pending_bytes": self.pending_bytes,
+            "active_bytes": self.size,
+            "rotations": self.rotations,
+        }
+
+    def _close_fd(self) -> None:
+        if self.fd is not None:
+            if self.fsync != "never":
+                os.fsync(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        if self.fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self.size = os.fstat(self.fd).st_size
+            self.active_since = self.segments.active_since(self.path.stem)
+        view = memoryview(b"".join(self.pending))
+        while view:
+            view = view[os.write(self.fd, view) :]
+        if self.fsync == "flush":
+            os.fsync(self.fd)
+        self.flushes += 1
+        self.bytes_written += self.pending_bytes
+        self.size += self.pending_bytes
+        self.pending.clear()
+        self.pending_bytes = 0
+        if self._rotation_due():
+            self._rotate()
+
+    def _rotation_due(self) -> bool:
+        if not self.size:
+            return False
+        if SEGMENT_MAX_BYTES and self.size >= SEGMENT_MAX_BYTES:
+            return True
+        return bool(SEGMENT_MAX_SECONDS) and time.time() - self.active_since >= SEGMENT_MAX_SECONDS
+
+    def _rotate(self) -> None:
+        # Only whole lines were written, so the sealed segment ends on a record boundary.
+        self._close_fd()
+        self.segments.seal(self.path)
+        self.size = 0
+        self.rotations += 1
+
+
+class AppenderPool:
+    """One ``JsonlAppender`` per path, plus a background thread enforcing the time threshold."""
+
+    def __init__(self):
+        self.appenders: dict[Path, JsonlAppender] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.flusher: threading.Thread | None = None
+
+    def get(self, path: Path) -> JsonlAppender:
+        appender = self.appenders.get(path)
+        if appender is None:
+            with self.lock:
+                appender = self.appenders.setdefault(path, JsonlAppender(path))
+                if self.flusher is None or not self.flusher.is_alive():
+                    self.stop_event.clear()
+                    self.flusher = threading.Thread(target=self._run, name="jsonl-flusher", daemon=True)
+                    self.flusher.start()
+        return appender
+
+    def flush(self, force: bool = False) -> None:
+        for appender in list(self.appenders.values()):
+            appender.flush(force)
+
+    def close(self) -> None:
+        """Flush, fsync and close every file; later writes reopen (and recreate) them."""
+        with self.lock:
+            appenders, self.appenders = self.appenders, {}
+        for appender in appenders.values():
+            appender.close()
+
+    def shutdown(self) -> None:
+        self.stop_event.set()
+        if self.flusher and self.flusher.is_alive():
+            self.flusher.join(timeout=2.0)
+        self.close()
+
+    def maintain(self) -> None:
+        """Time-based rotation for idle files, then compression and retention of sealed segments."""
+        for appender in list(self.appenders.values()):
+            appender.rotate_if_due()
+        maintain_all()
+
+    def stats(self) -> dict[str, Any]:
+        return {str(path): a.stats() for path, a in list(self.appenders.items())}
+
+    def _run(self) -> None:
+        interval = max(FLUSH_SECONDS / 2, 0.01)
+        last_maintained = time.monotonic()
+        while not self.stop_event.wait(interval):
+            try:
+                self.flush()
+                if time.monotonic() - last_maintained >= MAINTAIN_SECONDS:
+                    last_maintained = time.monotonic()
+                    self.maintain()
+            except OSError:
+                continue
+
+
+appenders = AppenderPool()
+
+
+def write_jsonl(path: Path, row: dict[str, Any] | bytes) -> None:
+    """Append a record, or lines already serialized with ``dumps_line``, to a JSONL file."""
+    appenders.get(path).write(row if isinstance(row, bytes) else dumps_line(row))
 
 
 def add_dp_noise(value: float, epsilon: float = 1.0) -> float:
@@ -0,0 +1,312 @@
+import gzip
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from .serialization import dumps, loads
+
+try:
+    import zstandard
+except ImportError:  # "zstd" compression falls back to gzip
+    zstandard = None
+
+
+# An active JSONL file is sealed into a segment once it reaches SEGMENT_MAX_BYTES or
+# has been written for SEGMENT_MAX_SECONDS (0 disables either trigger). Sealed
+# segments stay plain ``*.jsonl`` for SEGMENT_COMPRESS_AFTER seconds while they are
+# still hot, then are compressed when SEGMENT_COMPRESSION is gzip|zstd; detector
+# readers (jsonl_tail) decompress archives, so zstd needs zstandard there too.
+# Segments older than SEGMENT_RETAIN_SECONDS, or beyond SEGMENT_RETAIN_BYTES per
+# stream (oldest first), are deleted.
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+SEGMENT_MAX_SECONDS = float(os.getenv("SEGMENT_MAX_SECONDS", "3600"))
+SEGMENT_COMPRESSION = os.getenv("SEGMENT_COMPRESSION", "none")
+SEGMENT_COMPRESS_AFTER = float(os.getenv("SEGMENT_COMPRESS_AFTER_SECONDS", "300"))
+SEGMENT_RETAIN_SECONDS = float(os.getenv("SEGMENT_RETAIN_SECONDS", str(7 * 24 * 3600)))
+SEGMENT_RETAIN_BYTES = int(os.getenv("SEGMENT_RETAIN_BYTES", "0"))
+
+MANIFEST_NAME = "_segments.json"
+# <stream>.<sealed at, UTC>-<seq>.jsonl[.gz|.zst]; the simulator seals its own files the same way.
+SEALED = re.compile(r"^(?P<stream>.+)\.(?P<stamp>\d{8}T\d{6}Z)-(?P<seq>\d{6})\.jsonl(?P<ext>\.gz|\.zst)?$")
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+TAIL_PROBE = 64 * 1024
+
+
+def open_segment(path: Path) -> BinaryIO:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise OSError(f"zstandard is not installed; cannot read {path.name}")
+        return zstandard.ZstdDecompressor().stream_reader(path.open("rb"), closefd=True)
+    return path.open("rb")
+
+
+def record_ts(line: bytes) -> str | None:
+    try:
+        ts = loads(line).get("ts")
+    except ValueError:
+        return None
+    return ts if isinstance(ts, str) else None
+
+
+def describe(path: Path) -> dict[str, Any]:
+    """Size and ts range of a plain sealed segment, from its first and last lines only."""
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        first = f.readline()
+        f.seek(max(0, size - TAIL_PROBE))
+        tail = f.read().rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    return {"name": path.name, "bytes": size, "first_ts": record_ts(first), "last_ts": record_ts(tail)}
+
+
+def compress(path: Path, codec: str) -> Path:
+    """Compress a sealed segment next to itself and remove the plain copy."""
+    if codec == "zstd" and zstandard is None:
+        codec = "gzip"
+    target = path.with_name(path.name + EXTENSIONS[codec])
+    tmp = target.with_name(target.name + ".tmp")
+    with path.open("rb") as src, tmp.open("wb") as raw:
+        if codec == "zstd":
+            with zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False) as out:
+                while chunk := src.read(1024 * 1024):
+                    out.write(chunk)
+        else:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as out:
+                while chunk := src.read(1024 * 1024):
+                    out.write(chunk)
+    os.replace(tmp, target)
+    path.unlink()
+    return target
+
+
+class SegmentStore:
+    """Sealed segments of every JSONL stream in one directory, indexed by a manifest.
+
+    The manifest (``_segments.json``) lists each stream's sealed segments, oldest
+    first, with their byte size and first/last ``ts``. That lets time-range readers
+    skip whole segments and lets retention run without opening any of them.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.manifest_path = directory / MANIFEST_NAME
+        self.lock = threading.Lock()
+        self.manifest: dict[str, Any] | None = None
+        self.compressions = 0
+        self.expired = 0
+
+    def active_since(self, stream: str) -> float:
+        """When the stream's current active file was started (first write after the last seal)."""
+        with self.lock:
+            entry = self._stream(stream)
+            if entry.get("active_since") is None:
+                entry["active_since"] = time.time()
+                self._save()
+            return entry["active_since"]
+
+    def seal(self, active: Path) -> dict[str, Any] | None:
+        """Rename ``active`` to the stream's next segment; the caller must have closed it."""
+        with self.lock:
+            if not active.exists() or active.stat().st_size == 0:
+                return None
+            entry = self._stream(active.stem)
+            seq = entry.get("seq", 0) + 1
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            sealed = active.with_name(f"{active.stem}.{stamp}-{seq:06d}.jsonl")
+            os.rename(active, sealed)
+            # Recreate the active file at once: detector tailers only carry their offset
+            # onto the segment once the stream's path is back (jsonl_tail.follow_renames).
+            active.touch()
+            segment = {**describe(sealed), "seq": seq, "sealed_at": time.time(), "compression": "none"}
+            entry["seq"] = seq
+            entry["active_since"] = None
+            entry["segments"].append(segment)
+            self._save()
+            return segment
+
+    def maintain(self) -> dict[str, int]:
+        """Index segments sealed by other writers, compress aged ones and apply retention."""
+        now = time.time()
+        with self.lock:
+            self._adopt()
+            to_compress = []
+            if SEGMENT_COMPRESSION in EXTENSIONS:
+                to_compress = [
+                    s["name"]
+                    for entry in self.manifest["streams"].values()
+                    for s in entry["segments"]
+                    if s["compression"] == "none" and now - s["sealed_at"] >= SEGMENT_COMPRESS_AFTER
+                ]
+        # Compression runs outside the lock so sealing (on the write path) never waits on it.
+        compressed = 0
+        for name in to_compress:
+            try:
+                target = compress(self.directory / name, SEGMENT_COMPRESSION)
+            except FileNotFoundError:
+                continue
+            with self.lock:
+                for entry in self.manifest["streams"].values():
+                    for s in entry["segments"]:
+                        if s["name"] == name:
+                            s["name"] = target.name
+                            s["compression"] = "zstd" if target.suffix == ".zst" else "gzip"
+                            s["stored_bytes"] = target.stat().st_size
+                self._save()
+            compressed += 1
+        # Retention last, so the byte budget is measured on what is stored after compression.
+        with self.lock:
+            expired = sum(self._expire(entry, now) for entry in self.manifest["streams"].values())
+            self._save()
+        self.compressions += compressed
+        self.expired += expired
+        return {"compressed": compressed, "expired": expired}
+
+    def select(self, stream: str, start: str | None = None, end: str | None = None) -> list[Path]:
+        """Files of ``stream`` that may hold records with ``start <= ts < end``, oldest first.
+
+        Sealed segments are pruned on their recorded ts range; the active file is
+        skipped only when the window ends before the newest sealed record.
+        """
+        with self.lock:
+            entry = self._stream(stream)
+            segments = list(entry["segments"])
+        paths = []
+        for s in segments:
+            if start is not None and s["last_ts"] is not None and s["last_ts"] < start:
+                continue
+            if end is not None and s["first_ts"] is not None and s["first_ts"] >= end:
+                continue
+            paths.append(self.directory / s["name"])
+        newest = max((s["last_ts"] for s in segments if s["last_ts"]), default=None)
+        active = self.directory / f"{stream}.jsonl"
+        if active.exists() and (end is None or newest is None or end > newest):
+            paths.append(active)
+        return paths
+
+    def read(self, stream: str, start: str | None = None, end: str | None = None, limit: int = 1000) -> list[dict[str, Any]]:
+        """Records of ``stream`` with ``start <= ts < end``, oldest first, at most ``limit``."""
+        out: list[dict[str, Any]] = []
+        for path in self.select(stream, start, end):
+            f = None
+            for candidate in (path, *(path.with_name(path.name + ext) for ext in EXTENSIONS.values())):
+                try:
+                    f = open_segment(candidate)  # a plain segment may have been compressed since select()
+                    break
+                except FileNotFoundError:
+                    continue
+            if f is None:
+                continue
+            with f:
+                for line in f:
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        continue
+                    ts = record.get("ts")
+                    if not isinstance(ts, str) or (start is not None and ts < start) or (end is not None and ts >= end):
+                        continue
+                    out.append(record)
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def purge(self) -> None:
+        """Delete every active file, sealed segment and the manifest (``/lab/reset``)."""
+        with self.lock:
+            for pattern in ("*.jsonl", "*.jsonl.gz", "*.jsonl.zst", MANIFEST_NAME):
+                for p in self.directory.glob(pattern):
+                    p.unlink(missing_ok=True)
+            self.manifest = {"streams": {}}
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            self._load()
+            streams = {
+                name: {
+                    "segments": len(e["segments"]),
+                    "bytes": sum(s["bytes"] for s in e["segments"]),
+                    "stored_bytes": sum(s.get("stored_bytes", s["bytes"]) for s in e["segments"]),
+                    "oldest_ts": e["segments"][0]["first_ts"] if e["segments"] else None,
+                }
+                for name, e in self.manifest["streams"].items()
+            }
+        return {"streams": streams, "compressions": self.compressions, "expired": self.expired}
+
+    def _load(self) -> None:
+        if self.manifest is not None:
+            return
+        try:
+            self.manifest = loads(self.manifest_path.read_bytes())
+        except (OSError, ValueError):
+            self.manifest = {"streams": {}}
+
+    def _save(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_name(MANIFEST_NAME + ".tmp")
+        tmp.write_bytes(dumps(self.manifest))
+        os.replace(tmp, self.manifest_path)
+
+    def _stream(self, stream: str) -> dict[str, Any]:
+        self._load()
+        return self.manifest["streams"].setdefault(stream, {"seq": 0, "active_since": None, "segments": []})
+
+    def _adopt(self) -> None:
+        """Sync the manifest with the directory: index foreign sealed files, forget deleted ones."""
+        self._load()
+        present = {}
+        for p in self.directory.glob("*.jsonl*"):
+            m = SEALED.match(p.name)
+            if m:
+                present[p.name] = (m, p)
+        known = set()
+        for entry in self.manifest["streams"].values():
+            entry["segments"] = [s for s in entry["segments"] if s["name"] in present]
+            known.update(s["name"] for s in entry["segments"])
+        for name, (m, p) in sorted(present.items()):
+            if name in known or m["ext"]:
+                continue
+            try:
+                segment = describe(p)
+            except FileNotFoundError:
+                continue
+            entry = self._stream(m["stream"])
+            seq = int(m["seq"])
+            sealed_at = datetime.strptime(m["stamp"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).timestamp()
+            entry["segments"].append({**segment, "seq": seq, "sealed_at": sealed_at, "compression": "none"})
+            entry["segments"].sort(key=lambda s: (s["sealed_at"], s["seq"]))
+            entry["seq"] = max(entry.get("seq", 0), seq)
+
+    def _expire(self, entry: dict[str, Any], now: float) -> int:
+        segments = entry["segments"]
+        total = sum(s.get("stored_bytes", s["bytes"]) for s in segments)
+        expired = 0
+        while segments:
+            oldest = segments[0]
+            too_old = SEGMENT_RETAIN_SECONDS and now - oldest["sealed_at"] > SEGMENT_RETAIN_SECONDS
+            too_big = SEGMENT_RETAIN_BYTES and total > SEGMENT_RETAIN_BYTES
+            if not (too_old or too_big):
+                break
+            (self.directory / oldest["name"]).unlink(missing_ok=True)
+            total -= oldest.get("stored_bytes", oldest["bytes"])
+            segments.pop(0)
+            expired += 1
+        return expired
+
+
+_stores: dict[Path, SegmentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def segment_store(directory: Path) -> SegmentStore:
+    with _stores_lock:
+        return _stores.setdefault(directory, SegmentStore(directory))
+
+
+def maintain_all() -> None:
+    for store in list(_stores.values()):
+        store.maintain()
@@ -0,0 +1,48 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # stdlib json produces the same compact output, only slower
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+class Encoded(bytes):
+    """An already-serialized JSON value that ``dumps_object`` splices in verbatim."""
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_line(obj: Any) -> bytes:
+    """Serialize one JSONL record, newline included."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return dumps(obj) + b"\n"
+
+
+def loads(data: bytes | str) -> Any:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch one type.
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode(obj: Any) -> Encoded:
+    return Encoded(dumps(obj))
+
+
+def encoded_array(items: list[Encoded]) -> Encoded:
+    return Encoded(b"[" + b",".join(items) + b"]")
+
+
+def dumps_object(fields: dict[str, Any]) -> bytes:
+    """Serialize a flat object whose values may be ``Encoded`` fragments serialized earlier."""
+    parts = [dumps(k) + b":" + (v if isinstance(v, Encoded) else dumps(v)) for k, v in fields.items()]
+    return b"{" + b",".join(parts) + b"}"
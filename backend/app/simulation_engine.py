@@ -1,18 +1,35 @@
+import multiprocessing
+import os
 import random
 import threading
 import time
 import uuid
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
-from .security_utils import anonymize_event, maybe, utc_ts, write_jsonl
-from .telemetry import RuntimeState, TelemetryHub
+from .ml_scoring import ModelScorer
+from .security_utils import anonymize_events, maybe, utc_ts, write_jsonl
+from .serialization import Encoded, dumps_line, encode, encoded_array
+from .telemetry import RuntimeState, StateDelta, TelemetryHub
 
 
 EVENT_FILE = Path("/data/events/realtime_events.jsonl")
 ALERT_FILE = Path("/data/alerts/live_alerts.jsonl")
 
+LOAD_TECHNIQUES = ["T1078", "T1003", "T1021", "BRUTE", "EVASION"]
+# Share of throughput-mode events that are benign noise when noise is enabled.
+LOAD_NOISE_RATIO = float(os.getenv("LOAD_NOISE_RATIO", "0.3"))
+LOAD_MAX_BATCH = 5000
+
+# Attack and chain runs are jobs on a bounded pool: ATTACK_WORKERS run at once and
+# at most ATTACK_MAX_ACTIVE may be queued or running before submissions are refused.
+ATTACK_WORKERS = int(os.getenv("ATTACK_WORKERS", "16"))
+ATTACK_MAX_ACTIVE = int(os.getenv("ATTACK_MAX_ACTIVE", "64"))
+JOB_HISTORY = 200
+
 
 @dataclass
 class AttackRequest:
@@ -21,74 +38,383 @@ class AttackRequest:
     count: int = 20
 
 
+@dataclass
+class LoadRequest:
+    rate: float = 0.0  # target events/sec; 0 generates as fast as the pipeline allows
+    duration: float = 30.0  # seconds; 0 runs until stopped
+    batch_size: int = 500
+    include_noise: bool = True
+    evasion: bool = False
+    workers: int = 1  # >1 generates and evaluates batches in that many worker processes
+
+
+@dataclass
+class AttackJob:
+    id: str
+    kind: str
+    params: dict[str, Any]
+    status: str = "queued"  # queued -> running -> completed | cancelled | failed
+    created: str = field(default_factory=utc_ts)
+    started: str | None = None
+    finished: str | None = None
+    events: int = 0
+    error: str | None = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Future | None = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "events": self.events,
+            "error": self.error,
+            "cancel_requested": self.cancelled,
+        }
+
+
+def is_evasion_attempt(event: dict[str, Any]) -> bool:
+    return bool(event.get("evasion_mode")) or event.get("marker_encoding") in {"base64", "xor"}
+
+
+def account(delta: StateDelta, event: dict[str, Any], safe_event: dict[str, Any], safe_alerts: list[dict[str, Any]]) -> None:
+    """Fold one processed event into ``delta``.
+
+    Per-technique tallies are keyed by the event's technique, so false positives
+    raised on benign noise land on the NOISE row.
+    """
+    counters = delta.counters
+    techniques = delta.techniques
+    technique = event.get("technique")
+    if event.get("event_type") == "attack_step":
+        counters["attack_count"] += 1
+        if is_evasion_attempt(event):
+            counters["evasion_attempts"] += 1
+            if any(a.get("alert_type") == "rule_bypassed" for a in safe_alerts):
+                counters["evasion_success"] += 1
+    if technique:
+        techniques[(technique, "executed")] = techniques.get((technique, "executed"), 0) + 1
+    delta.replay_events.append(safe_event)
+    delta.attack_timeline.append(
+        {
+            "ts": safe_event["ts"],
+            "technique": safe_event.get("technique", "N/A"),
+            "action": safe_event.get("action", "N/A"),
+            "result": safe_event.get("result", "N/A"),
+        }
+    )
+    for alert in safe_alerts:
+        delta.alerts.append(alert)
+        counters["alert_count"] += 1
+        if alert.get("detected"):
+            counters["detected_alerts"] += 1
+        if alert.get("is_false_positive"):
+            counters["false_positives"] += 1
+            metric = "false_positives"
+        else:
+            metric = "detected" if alert.get("detected") else None
+        if technique and metric:
+            techniques[(technique, metric)] = techniques.get((technique, metric), 0) + 1
+        if alert.get("detector") == "ml_isolation_forest_sim":
+            delta.ml_confidence.append(
+                {
+                    "ts": alert.get("ts"),
+                    "confidence": alert.get("ml_confidence", 0.0),
+                    "technique": alert.get("technique", "N/A"),
+                }
+            )
+
+
+class EventTemplates:
+    """Precomputed event variants for throughput mode.
+
+    Every random field of ``_generate_event``/``_noise_event`` is drawn up front, and
+    the technique mix is laid out as a shuffled lookup table, so producing an event
+    is an index, a dict copy and a few per-event fields.
+    """
+
+    def __init__(self, engine: "AttackSimulationEngine", req: LoadRequest, variants: int = 64, size: int = 8192):
+        pool = [engine._generate_event(t, "", 0, 0, req.evasion) for t in LOAD_TECHNIQUES for _ in range(variants)]
+        weights = [(1.0 - LOAD_NOISE_RATIO if req.include_noise else 1.0) / len(pool)] * len(pool)
+        if req.include_noise:
+            noise = [engine._noise_event("") for _ in range(variants)]
+            pool += noise
+            weights += [LOAD_NOISE_RATIO / len(noise)] * len(noise)
+        for template in pool:
+            del template["id"], template["ts"]
+        self.table = random.choices(pool, weights=weights, k=size)
+        self.pos = 0
+
+    def batch(self, n: int, attack_id: str, step: int) -> list[dict[str, Any]]:
+        ts = utc_ts()
+        table, size = self.table, len(self.table)
+        events = []
+        for i in range(n):
+            event = dict(table[(self.pos + i) % size])
+            step += 1
+            event["id"] = f"{attack_id}-{step}"
+            event["ts"] = ts
+            event["attack_id"] = attack_id
+            if "step_number" in event:
+                event["step_number"] = step
+            events.append(event)
+        self.pos = (self.pos + n) % size
+        return events
+
+
 class AttackSimulationEngine:
-    def __init__(self, state: RuntimeState, telemetry: TelemetryHub):
+    def __init__(self, state: RuntimeState, telemetry: TelemetryHub, scorer: ModelScorer | None = None):
         self.state = state
         self.telemetry = telemetry
+        self.scorer = scorer
         self.stop_event = threading.Event()
-        self.worker: threading.Thread | None = None
+        self.pool = ThreadPoolExecutor(max_workers=ATTACK_WORKERS, thread_name_prefix="attack-job")
+        self.jobs: OrderedDict[str, AttackJob] = OrderedDict()
+        self.jobs_lock = threading.Lock()
+        self.load_worker: threading.Thread | None = None
+        self.load_pool: ProcessPoolExecutor | None = None
+        self.load_pool_workers = 0
+        self.load: dict[str, Any] = {"running": False}
         self.failure_window: dict[str, int] = {}
 
     def is_running(self) -> bool:
-        return self.worker is not None and self.worker.is_alive()
+        return any(job.active for job in list(self.jobs.values()))
+
+    def is_loading(self) -> bool:
+        worker = self.load_worker
+        return worker is not None and worker.is_alive() and self.load.get("running", False)
+
+    def start_chain(self, profile: str, include_noise: bool, evasion: bool) -> AttackJob | None:
+        params = {"attack_id": str(uuid.uuid4()), "profile": profile, "include_noise": include_noise, "evasion": evasion}
+        return self._submit("chain", params, lambda job: self._run_chain(job, profile, include_noise, evasion))
+
+    def trigger_attack(self, req: AttackRequest) -> AttackJob | None:
+        params = {"attack_id": str(uuid.uuid4()), "technique": req.technique, "evasion": req.evasion, "count": req.count}
+        return self._submit("attack", params, lambda job: self._run_attack(job, req))
+
+    def start_campaign(self, chains: int, profiles: list[str], include_noise: bool, evasion_rate: float) -> list[AttackJob]:
+        """Submit ``chains`` concurrent adversary chains, cycling profiles and drawing evasion per chain."""
+        jobs = []
+        for i in range(chains):
+            job = self.start_chain(profiles[i % len(profiles)], include_noise, maybe(evasion_rate))
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    def get_job(self, job_id: str) -> AttackJob | None:
+        return self.jobs.get(job_id)
 
-    def start_chain(self, profile: str, include_noise: bool, evasion: bool) -> bool:
-        if self.is_running():
+    def list_jobs(self) -> list[AttackJob]:
+        with self.jobs_lock:
+            return list(self.jobs.values())
+
+    def cancel_job(self, job_id: str) -> AttackJob | None:
+        job = self.jobs.get(job_id)
+        if job is not None and job.active:
+            job.cancel_event.set()
+        return job
+
+    def _submit(self, kind: str, params: dict[str, Any], target) -> AttackJob | None:
+        """Queue ``target(job)`` on the worker pool; None when too many jobs are already active."""
+        with self.jobs_lock:
+            if sum(job.active for job in self.jobs.values()) >= ATTACK_MAX_ACTIVE:
+                return None
+            job = AttackJob(str(uuid.uuid4()), kind, params)
+            self.jobs[job.id] = job
+            while len(self.jobs) > JOB_HISTORY:
+                oldest = next((k for k, j in self.jobs.items() if not j.active), None)
+                if oldest is None:
+                    break
+                del self.jobs[oldest]
+        self._sync_running()
+        job.future = self.pool.submit(self._run_job, job, target)
+        return job
+
+    def _run_job(self, job: AttackJob, target) -> None:
+        if not job.cancelled:
+            job.status = "running"
+            job.started = utc_ts()
+            try:
+                target(job)
+            except Exception as exc:
+                job.error = str(exc)
+        job.status = "failed" if job.error else "cancelled" if job.cancelled else "completed"
+        job.finished = utc_ts()
+        self._sync_running()
+
+    def _sync_running(self) -> None:
+        running = self.is_running() or self.is_loading()
+        if running != self.state.running:
+            self.state.configure(running=running)
+
+    def start_load(self, req: LoadRequest) -> bool:
+        """Start throughput mode: synthetic events at ``req.rate`` events/sec, in batches."""
+        if self.is_loading():
             return False
         self.stop_event.clear()
-        self.worker = threading.Thread(
-            target=self._run_chain, args=(profile, include_noise, evasion), daemon=True
-        )
-        self.worker.start()
-        with self.state.lock:
-            self.state.running = True
+        self.load = {"running": True, "target_eps": req.rate or None, "duration": req.duration, "generated": 0}
+        self.load_worker = threading.Thread(target=self._run_load, args=(req,), name="load-generator", daemon=True)
+        self.load_worker.start()
+        self.state.configure(running=True)
         return True
 
+    def load_status(self) -> dict[str, Any]:
+        return dict(self.load)
+
     def stop(self) -> None:
+        """Cancel every attack job and the load generator, waiting briefly for them to wind down."""
+        jobs = [job for job in self.list_jobs() if job.active]
+        for job in jobs:
+            job.cancel_event.set()
+        self.stop_load()
+        wait([job.future for job in jobs if job.future], timeout=2.0)
+        self.state.configure(running=False)
+
+    def stop_load(self) -> None:
         self.stop_event.set()
-        if self.worker and self.worker.is_alive():
-            self.worker.join(timeout=2.0)
-        with self.state.lock:
-            self.state.running = False
+        worker = self.load_worker
+        if worker and worker.is_alive():
+            worker.join(timeout=2.0)
 
-    def trigger_attack(self, req: AttackRequest) -> dict[str, Any]:
-        attack_id = str(uuid.uuid4())
+    def close(self) -> None:
+        self.stop()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.load_pool is not None:
+            self.load_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run_attack(self, job: AttackJob, req: AttackRequest) -> None:
+        attack_id = job.params["attack_id"]
         for idx in range(req.count):
-            if self.stop_event.is_set():
+            if job.cancel_event.wait(0.15 if idx else 0):
                 break
             event = self._generate_event(req.technique, attack_id, idx + 1, req.count, req.evasion)
             self._process_event(event)
-            time.sleep(0.15)
-        return {"ok": True, "attack_id": attack_id, "technique": req.technique, "count": req.count}
+            job.events += 1
 
-    def _run_chain(self, profile: str, include_noise: bool, evasion: bool) -> None:
+    def _run_chain(self, job: AttackJob, profile: str, include_noise: bool, evasion: bool) -> None:
         profile_rounds = {"low": 1, "medium": 2, "high": 3}.get(profile, 2)
         chain = ["T1078", "T1003", "T1021", "BRUTE", "EVASION"]
-        attack_id = str(uuid.uuid4())
+        attack_id = job.params["attack_id"]
         total = profile_rounds * len(chain) * 4
         step = 0
         for _ in range(profile_rounds):
             for technique in chain:
                 for _ in range(4):
-                    if self.stop_event.is_set():
-                        with self.state.lock:
-                            self.state.running = False
+                    if job.cancelled:
                         return
                     step += 1
                     event = self._generate_event(technique, attack_id, step, total, evasion)
                     self._process_event(event)
-                    time.sleep(0.25 if profile == "high" else 0.35)
+                    job.events += 1
+                    job.cancel_event.wait(0.25 if profile == "high" else 0.35)
             if include_noise:
                 for _ in range(6):
-                    if self.stop_event.is_set():
-                        with self.state.lock:
-                            self.state.running = False
+                    if job.cancelled:
                         return
                     noise = self._noise_event(attack_id)
                     self._process_event(noise)
-                    time.sleep(0.2)
-        with self.state.lock:
-            self.state.running = False
+                    job.events += 1
+                    job.cancel_event.wait(0.2)
+
+    def _run_load(self, req: LoadRequest) -> None:
+        try:
+            self._generate_load(req)
+        except Exception as exc:
+            self.load = {**self.load, "error": str(exc)}
+        finally:
+            self.load = {**self.load, "running": False}
+            self._sync_running()
+
+    def _generate_load(self, req: LoadRequest) -> None:
+        """Produce load batches on schedule; with ``req.workers`` > 1 they are built in worker processes.
+
+        Process workers generate, alert on, serialize and account their batches, and
+        return the encoded lines plus a ``StateDelta``. This thread only writes the
+        bytes and applies the delta, in submission order.
+        """
+        batch_size = max(1, min(req.batch_size, LOAD_MAX_BATCH))
+        workers = max(1, min(req.workers, os.cpu_count() or 1))
+        pool = self._load_pool(workers) if workers > 1 else None
+        templates = None if pool else EventTemplates(self, req)
+        # Under a target rate, let ~10 ms of events accumulate rather than ship single-event batches.
+        min_batch = max(1, min(batch_size, int(req.rate * 0.01))) if req.rate else batch_size
+        attack_id = str(uuid.uuid4())
+        inflight: deque[tuple[Future, int, float]] = deque()
+        start = time.monotonic()
+        submitted = 0
+        generated = 0
+        batches = 0
+        while True:
+            now = time.monotonic()
+            producing = not self.stop_event.is_set() and not (req.duration and now - start >= req.duration)
+            if not producing and not inflight:
+                break
+            n = batch_size
+            if req.rate:
+                n = min(int((now - start) * req.rate) - submitted, batch_size)
+            if producing and n >= min_batch and len(inflight) < 2 * workers:
+                if pool is not None:
+                    args = (req, attack_id, submitted, n, self.state.mode, self.state.anonymize_logs)
+                    inflight.append((pool.submit(_load_worker_batch, *args), n, now))
+                    submitted += n
+                    continue
+                self._process_events(templates.batch(n, attack_id, submitted), publish_each=False)
+                submitted += n
+                t0 = now
+            elif inflight:
+                future, n, t0 = inflight.popleft()
+                event_lines, alert_lines, delta = future.result()
+                write_jsonl(EVENT_FILE, event_lines)
+                if alert_lines:
+                    write_jsonl(ALERT_FILE, alert_lines)
+                self.state.apply(delta)
+            else:
+                time.sleep(max(0.0, (submitted + min_batch) / req.rate - (now - start)) if req.rate else 0.001)
+                continue
+            now = time.monotonic()
+            generated += n
+            batches += 1
+            elapsed = now - start
+            self.load = {
+                "running": True,
+                "attack_id": attack_id,
+                "target_eps": req.rate or None,
+                "duration": req.duration,
+                "workers": workers,
+                "generated": generated,
+                "batches": batches,
+                "elapsed_s": round(elapsed, 3),
+                "achieved_eps": round(generated / elapsed, 1) if elapsed else 0.0,
+                "last_batch_size": n,
+                "last_batch_ms": round((now - t0) * 1000, 3),
+                # How far generation is behind the target schedule.
+                "lag_ms": round(max(0.0, elapsed - generated / req.rate) * 1000, 1) if req.rate else 0.0,
+            }
+            self.telemetry.publish({"kind": "load", "load": self.load, "counters": self.state.counters()})
+
+    def _load_pool(self, workers: int) -> ProcessPoolExecutor:
+        pool = self.load_pool
+        if pool is None or self.load_pool_workers != workers:
+            if pool is not None:
+                pool.shutdown(wait=False)
+            self.load_pool_workers = workers
+            # spawn, not fork: the parent runs threads (scorer, appenders, event loop) whose locks must not be inherited.
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=_load_worker_init)
+            self.load_pool = pool
+        return pool
 
     def _base_event(self, technique: str, attack_id: str, step: int, total_steps: int) -> dict[str, Any]:
         return {
@@ -171,7 +497,7 @@ class AttackSimulationEngine:
             "false_positive_candidate": maybe(0.15),
         }
 
-    def _alert_from_event(self, event: dict[str, Any]) -> list[dict[str, Any]]:
+    def _alert_from_event(self, event: dict[str, Any], scored: tuple[float, bool] | None = None) -> list[dict[str, Any]]:
         alerts: list[dict[str, Any]] = []
         mode = self.state.mode
         is_attack = event.get("event_type") == "attack_step"
@@ -193,14 +519,8 @@ class AttackSimulationEngine:
 
         if is_attack:
             # Rule-based simulation (Suricata/Snort-like)
-            evasion_attempt = bool(event.get("evasion_mode")) or event.get("marker_encoding") in {"base64", "xor"}
-            if evasion_attempt:
-                with self.state.lock:
-                    self.state.evasion_attempts += 1
+            evasion_attempt = is_evasion_attempt(event)
             detected_rule = not (mode == "legacy" and evasion_attempt)
-            if evasion_attempt and not detected_rule:
-                with self.state.lock:
-                    self.state.evasion_success += 1
             alerts.append(
                 {
                     "ts": utc_ts(),
@@ -234,9 +554,13 @@ class AttackSimulationEngine:
                         }
                     )
 
-            # ML anomaly simulation
-            score = random.uniform(0.45, 0.99) if is_attack else random.uniform(0.05, 0.35)
-            is_anomaly = score > 0.72
+            # ML anomaly scoring: the detector's IsolationForest when a model is available,
+            # otherwise a simulated confidence. ``scored`` comes from _process_events' batch call.
+            if scored is None:
+                score = random.uniform(0.45, 0.99) if is_attack else random.uniform(0.05, 0.35)
+                is_anomaly = score > 0.72
+            else:
+                score, is_anomaly = scored
             alerts.append(
                 {
                     "ts": utc_ts(),
@@ -247,45 +571,80 @@ class AttackSimulationEngine:
                     "detected": is_anomaly,
                     "is_false_positive": False,
                     "ml_confidence": round(score, 3),
-                    "reason": "isolation_forest_score",
+                    "reason": "isolation_forest_score" if scored is None else "isolation_forest_model",
                 }
             )
+        for alert in alerts:
+            alert["attack_id"] = event.get("attack_id")
+            alert["source_event_id"] = event.get("id")
         return alerts
 
     def _process_event(self, event: dict[str, Any]) -> None:
-        write_jsonl(EVENT_FILE, event)
-        alerts = self._alert_from_event(event)
-        for alert in alerts:
-            write_jsonl(ALERT_FILE, alert)
-
-        safe_event = anonymize_event(event, self.state.anonymize_logs)
-        safe_alerts = [anonymize_event(a, self.state.anonymize_logs) for a in alerts]
-        with self.state.lock:
-            self.state.attack_count += 1 if event.get("event_type") == "attack_step" else 0
-            self.state.replay_events.append(safe_event)
-            self.state.attack_timeline.append(
-                {
-                    "ts": safe_event["ts"],
-                    "technique": safe_event.get("technique", "N/A"),
-                    "action": safe_event.get("action", "N/A"),
-                    "result": safe_event.get("result", "N/A"),
-                }
-            )
-            technique = safe_event.get("technique")
-            if technique in self.state.mitre_coverage:
-                self.state.mitre_coverage[technique] += 1
-            for alert in safe_alerts:
-                self.state.alerts.append(alert)
-                self.state.alert_count += 1
-                if alert.get("is_false_positive"):
-                    self.state.false_positives += 1
-                if alert.get("detector") == "ml_isolation_forest_sim":
-                    self.state.ml_confidence.append(
-                        {
-                            "ts": alert.get("ts"),
-                            "confidence": alert.get("ml_confidence", 0.0),
-                            "technique": alert.get("technique", "N/A"),
-                        }
-                    )
+        self._process_events([event])
+
+    def _process_events(self, events: list[dict[str, Any]], publish_each: bool = True) -> None:
+        """Alert on, persist and account a batch of events.
+
+        Model scoring is one batched call, each JSONL file gets one write and the state
+        lock is taken once for the whole batch. With ``publish_each`` every event goes
+        out as its own telemetry delta; throughput mode publishes per batch instead.
+        """
+        anonymize = self.state.anonymize_logs
+        event_lines, alert_lines, safe_events, safe_alerts, delta = self._evaluate(events, anonymize)
+        write_jsonl(EVENT_FILE, b"".join(event_lines))
+        if any(alert_lines):
+            write_jsonl(ALERT_FILE, b"".join(line for lines in alert_lines for line in lines))
+        self.state.apply(delta)
+        if not publish_each:
+            return
+
+        for i, (safe_event, alerts) in enumerate(zip(safe_events, safe_alerts)):
+            # Without anonymization the telemetry copies equal the records just written, so reuse their bytes.
+            if anonymize:
+                event_json = encode(safe_event)
+                alerts_json = encoded_array([encode(a) for a in alerts])
+            else:
+                event_json = Encoded(event_lines[i][:-1])
+                alerts_json = encoded_array([Encoded(line[:-1]) for line in alert_lines[i]])
+            self.telemetry.publish({"kind": "event", "event": event_json, "alerts": alerts_json, "counters": self.state.counters()})
+
+    def _evaluate(self, events: list[dict[str, Any]], anonymize: bool):
+        """Alert on and serialize ``events`` and account them into a ``StateDelta``, without touching shared state."""
+        attacks = [e for e in events if e.get("event_type") == "attack_step"]
+        scores = iter((self.scorer.score_many(attacks) if self.scorer and attacks else None) or ())
+        event_lines = []
+        alert_lines = []
+        batch_alerts = []
+        for event in events:
+            is_attack = event.get("event_type") == "attack_step"
+            alerts = self._alert_from_event(event, next(scores, None) if is_attack else None)
+            event_lines.append(dumps_line(event))
+            alert_lines.append([dumps_line(a) for a in alerts])
+            batch_alerts.append(alerts)
+
+        safe_events = anonymize_events(events, anonymize)
+        safe_alerts = [anonymize_events(alerts, anonymize) for alerts in batch_alerts]
+        delta = StateDelta()
+        for event, safe_event, alerts in zip(events, safe_events, safe_alerts):
+            account(delta, event, safe_event, alerts)
+        return event_lines, alert_lines, safe_events, safe_alerts, delta
+
+
+# Per-process state for load-generator workers, set up by _load_worker_init.
+_worker: dict[str, Any] = {}
+
+
+def _load_worker_init() -> None:
+    scorer = ModelScorer()
+    scorer.start()
+    _worker["engine"] = AttackSimulationEngine(RuntimeState(), None, scorer)
+
 
-        self.telemetry.publish({"kind": "event", "event": safe_event, "alerts": safe_alerts, "snapshot": self.state.snapshot()})
+def _load_worker_batch(req: LoadRequest, attack_id: str, step: int, n: int, mode: str, anonymize: bool) -> tuple[bytes, bytes, StateDelta]:
+    engine = _worker["engine"]
+    if _worker.get("attack_id") != attack_id:
+        _worker["attack_id"] = attack_id
+        _worker["templates"] = EventTemplates(engine, req)
+    engine.state.mode = mode
+    event_lines, alert_lines, _, _, delta = engine._evaluate(_worker["templates"].batch(n, attack_id, step), anonymize)
+    return b"".join(event_lines), b"".join(line for lines in alert_lines for line in lines), delta
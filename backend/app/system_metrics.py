@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+import psutil
+
+from .telemetry import RingBuffer
+
+
+SAMPLE_INTERVAL = float(os.getenv("METRICS_SAMPLE_SECONDS", "1.0"))
+SAMPLE_HISTORY = int(os.getenv("METRICS_HISTORY", "600"))
+
+MB = 1024 * 1024
+GB = 1024 * 1024 * 1024
+
+
+class SystemSampler:
+    """Samples host CPU, memory, disk and network on a background thread into a ring.
+
+    ``cpu_percent`` is read non-blocking (utilization since the previous sample)
+    and network throughput is the byte delta between consecutive samples, so
+    readers never wait on psutil.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, capacity: int = SAMPLE_HISTORY):
+        self.interval = interval
+        self.samples = RingBuffer(capacity, name="system_metrics")
+        self.worker: threading.Thread | None = None
+        self.stop_event = threading.Event()
+        self._last_net: tuple[float, Any] | None = None
+
+    def start(self) -> None:
+        if self.worker and self.worker.is_alive():
+            return
+        self.stop_event.clear()
+        psutil.cpu_percent(interval=None)  # prime: the first non-blocking reading is meaningless
+        self.sample()
+        self.worker = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self.worker.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.worker and self.worker.is_alive():
+            self.worker.join(timeout=2.0)
+
+    def sample(self) -> dict[str, Any]:
+        now = time.monotonic()
+        mem = psutil.virtual_memory()
+        disk = psutil.disk_usage("/")
+        net = psutil.net_io_counters()
+        tx_mbps = rx_mbps = 0.0
+        if self._last_net is not None:
+            last_at, last = self._last_net
+            elapsed = max(now - last_at, 1e-6)
+            tx_mbps = max(0, net.bytes_sent - last.bytes_sent) * 8 / 1e6 / elapsed
+            rx_mbps = max(0, net.bytes_recv - last.bytes_recv) * 8 / 1e6 / elapsed
+        self._last_net = (now, net)
+        sample = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "epoch": time.time(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": mem.percent,
+            "memory_used_mb": round(mem.used / MB, 2),
+            "memory_total_mb": round(mem.total / MB, 2),
+            "disk_percent": disk.percent,
+            "disk_used_gb": round(disk.used / GB, 2),
+            "disk_total_gb": round(disk.total / GB, 2),
+            "network_mbps": round(tx_mbps + rx_mbps, 3),
+            "network_tx_mbps": round(tx_mbps, 3),
+            "network_rx_mbps": round(rx_mbps, 3),
+            "network_sent_mb": round(net.bytes_sent / MB, 2),
+            "network_recv_mb": round(net.bytes_recv / MB, 2),
+        }
+        self.samples.append(sample)
+        return sample
+
+    def latest(self) -> dict[str, Any]:
+        recent = self.samples.tail(1)
+        return recent[0] if recent else self.sample()
+
+    def window(self, seconds: float) -> list[dict[str, Any]]:
+        """Samples from the last ``seconds``, oldest first."""
+        count = min(len(self.samples), int(seconds / self.interval) + 1)
+        cutoff = time.time() - seconds
+        return [s for s in self.samples.tail(count) if s["epoch"] >= cutoff]
+
+    def _run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                continue
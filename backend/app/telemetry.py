@@ -1,95 +1,700 @@
 import asyncio
-import json
+import os
 import threading
+import time
+from bisect import bisect_left
 from collections import deque
 from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
 from typing import Any
 
 from fastapi import WebSocket
 
+from .serialization import dumps, dumps_line, dumps_object, loads
+
+
+SPILL_DIR = Path(os.getenv("HISTORY_SPILL_DIR", "/data/replay"))
+# In-memory capacity per history; anything older is dropped, or spilled to disk when enabled.
+HISTORY_LIMITS = {
+    "ml_confidence": int(os.getenv("HISTORY_LIMIT_ML_CONFIDENCE", "2000")),
+    "attack_timeline": int(os.getenv("HISTORY_LIMIT_ATTACK_TIMELINE", "5000")),
+    "alerts": int(os.getenv("HISTORY_LIMIT_ALERTS", "5000")),
+    "replay_events": int(os.getenv("HISTORY_LIMIT_REPLAY_EVENTS", "5000")),
+}
+# Fields each history is indexed by for filtered queries; "bucket" is the record's minute.
+HISTORY_INDEXES = {
+    "alerts": ("technique", "detector", "attack_id", "severity", "bucket"),
+    "replay_events": ("technique", "attack_id", "event_type", "bucket"),
+}
+HISTORY_SPILL = {name for name in os.getenv("HISTORY_SPILL", "replay_events").split(",") if name}
+# Disk budget per spilled history: the spill file is rotated into ``<name>.prev.jsonl``
+# at half of it, and records older than the previous file are dropped.
+HISTORY_SPILL_MAX_BYTES = int(os.getenv("HISTORY_SPILL_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Per-connection send queue depth, and what to do with a client whose queue is full:
+# "drop_oldest" discards its oldest queued message (the client resyncs on the seq gap),
+# "disconnect" closes the connection.
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "256"))
+TELEMETRY_SLOW_CLIENT_POLICY = os.getenv("TELEMETRY_SLOW_CLIENT_POLICY", "drop_oldest")
+
+
+MITRE_TECHNIQUES = ("T1078", "T1003", "T1021", "BRUTE", "EVASION")
+# Per-technique tallies cover every technique the engine emits, including benign noise.
+TECHNIQUES = MITRE_TECHNIQUES + ("NOISE",)
+TECHNIQUE_METRICS = ("executed", "detected", "false_positives")
+COUNTER_FIELDS = ("attack_count", "alert_count", "detected_alerts", "false_positives", "evasion_attempts", "evasion_success")
+
+
+class ContentionLock:
+    """A mutex that records how often it was taken, how often a caller had to wait, and for how long."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+        self.wait_ns = 0
+        self.max_wait_ns = 0
+
+    def __enter__(self) -> "ContentionLock":
+        if not self._lock.acquire(blocking=False):
+            start = time.perf_counter_ns()
+            self._lock.acquire()
+            waited = time.perf_counter_ns() - start
+            self.contended += 1
+            self.wait_ns += waited
+            self.max_wait_ns = max(self.max_wait_ns, waited)
+        self.acquired += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._lock.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "contention_rate": round(self.contended / self.acquired, 4) if self.acquired else 0.0,
+            "wait_ms": round(self.wait_ns / 1e6, 3),
+            "max_wait_ms": round(self.max_wait_ns / 1e6, 3),
+        }
+
+
+def time_bucket(ts: str | None) -> str | None:
+    """Minute bucket of an ISO-8601 timestamp, e.g. ``2026-01-01T12:34``."""
+    return ts[:16] if isinstance(ts, str) else None
+
+
+class _Postings:
+    """Ascending absolute positions of the records holding one index key; evictions advance ``head``."""
+
+    __slots__ = ("positions", "head")
+
+    def __init__(self):
+        self.positions: list[int] = []
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.positions) - self.head
+
+    def popleft(self) -> None:
+        self.head += 1
+        if self.head > 1024 and self.head * 2 > len(self.positions):
+            del self.positions[: self.head]
+            self.head = 0
+
+
+class _Shard:
+    __slots__ = ("counts", "writes")
+
+    def __init__(self, keys: tuple):
+        self.counts = dict.fromkeys(keys, 0)
+        self.writes = 0
+
+
+class ShardedCounters:
+    """Counters split into one shard per writing thread, summed on read.
+
+    A thread only ever writes its own shard, so ``add`` takes no lock; readers sum
+    every shard and may trail an in-flight ``add`` by one update. Shards of threads
+    that have exited are folded into a retired total so the shard list stays small.
+    ``reset`` records a baseline instead of touching shards other threads own.
+    """
+
+    def __init__(self, keys: tuple):
+        self.keys = keys
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, _Shard]] = []
+        self._registry = threading.Lock()
+        self._retired = _Shard(keys)
+        self._base = dict.fromkeys(keys, 0)
+
+    def add(self, counts: dict) -> None:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(self.keys)
+            with self._registry:
+                self._shards.append((threading.current_thread(), shard))
+        for key, n in counts.items():
+            if n and key in shard.counts:
+                shard.counts[key] += n
+        shard.writes += 1
+
+    def _raw(self) -> _Shard:
+        total = _Shard(self.keys)
+        with self._registry:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                    continue
+                for key, n in shard.counts.items():
+                    self._retired.counts[key] += n
+                self._retired.writes += shard.writes
+            self._shards = live
+            shards = [self._retired] + [shard for _, shard in live]
+        for shard in shards:
+            total.writes += shard.writes
+            for key, n in shard.counts.items():
+                total.counts[key] += n
+        return total
+
+    def totals(self) -> dict:
+        raw = self._raw().counts
+        return {key: raw[key] - self._base[key] for key in self.keys}
+
+    def writes(self) -> int:
+        return self._raw().writes
+
+    def reset(self) -> None:
+        raw = self._raw()
+        with self._registry:
+            self._base = raw.counts
+            self._retired.writes += 1  # make the reset visible to snapshot versioning
+
+    def stats(self) -> dict[str, Any]:
+        with self._registry:
+            return {"shards": len(self._shards)}
+
+
+class RingBuffer:
+    """Fixed-capacity history with O(1) append and tail reads that copy only what is asked for.
+
+    With ``spill_path`` set, records evicted from memory are appended to a JSONL file,
+    so ``read`` can still page through history by absolute index, back to ``oldest``.
+    Evicted records are queued under the history lock and written after it is
+    released; the spill files start empty with each buffer, like ``total``.
+    """
+
+    def __init__(self, capacity: int, spill_path: Path | None = None, name: str = "history", index_fields: tuple[str, ...] = ()):
+        self.capacity = max(1, capacity)
+        # field -> key -> positions, covering the in-memory window only.
+        self.indexes: dict[str, dict[Any, _Postings]] = {f: {} for f in index_fields}
+        self.lock = ContentionLock(name)
+        # Bumped on every change, so readers can tell whether a cached copy is still current.
+        self.mutations = 0
+        self.spill_path = spill_path
+        self._buf: list[Any] = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+        self.total = 0
+        self._spill = None
+        # Evicted records waiting to be written; drained under _spill_lock, never the history lock.
+        self._evicted: deque[Any] = deque()
+        self._spill_lock = threading.Lock()
+        self._spill_bytes = 0
+        # Absolute indexes: first record in the previous / current spill file, next one to write.
+        self._prev_from = 0
+        self._cur_from = 0
+        self._written = 0
+        self._remove_spill()
+
+    @property
+    def oldest(self) -> int:
+        """Absolute index of the oldest record ``read`` can still return."""
+        with self.lock:
+            return self._prev_from if self.spill_path is not None else self.total - self._size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, item: Any) -> None:
+        with self.lock:
+            self._append(item)
+            self.mutations += 1
+        if self._evicted:
+            self._flush_evicted()
+
+    def extend(self, items: list[Any]) -> None:
+        if not items:
+            return
+        with self.lock:
+            for item in items:
+                self._append(item)
+            self.mutations += 1
+        if self._evicted:
+            self._flush_evicted()
+
+    def _append(self, item: Any) -> None:
+        end = (self._start + self._size) % self.capacity
+        if self.indexes:
+            self._index(item, self.total)
+        if self._size == self.capacity:
+            self._unindex(self._buf[self._start])
+            self._evict(self._buf[self._start])
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._size += 1
+        self._buf[end] = item
+        self.total += 1
+
+    @staticmethod
+    def _key(item: Any, name: str) -> Any:
+        return time_bucket(item.get("ts")) if name == "bucket" else item.get(name)
+
+    def _keys(self, item: Any):
+        for name in self.indexes:
+            key = self._key(item, name)
+            if key is not None and not isinstance(key, (list, dict)):
+                yield name, key
+
+    def _index(self, item: Any, pos: int) -> None:
+        for name, key in self._keys(item):
+            postings = self.indexes[name].get(key)
+            if postings is None:
+                postings = self.indexes[name][key] = _Postings()
+            postings.positions.append(pos)
+
+    def _unindex(self, item: Any) -> None:
+        # The evicted record is the oldest, so it heads every postings list it is on.
+        for name, key in self._keys(item):
+            postings = self.indexes[name][key]
+            postings.popleft()
+            if not postings:
+                del self.indexes[name][key]
+
+    def query(self, filters: dict[str, Any], before: int | None = None, limit: int = 100, since: str | None = None) -> tuple[list[Any], int | None]:
+        """Page backwards through in-memory records matching every filter.
+
+        Scans newest first from absolute index ``before`` (exclusive), walking the
+        shortest postings list among the indexed filters and checking the rest per
+        record; ``since`` stops at the first record older than that timestamp.
+        Returns the page oldest-first and the cursor for the next (older) page.
+        """
+        with self.lock:
+            first = self.total - self._size
+            end = self.total if before is None else min(before, self.total)
+            lists = []
+            for name, value in filters.items():
+                postings = self.indexes.get(name, {}).get(value)
+                if postings is None:
+                    return [], None
+                lists.append(postings)
+            if lists:
+                driver = min(lists, key=len)
+                hi = bisect_left(driver.positions, end, driver.head)
+                candidates = (driver.positions[i] for i in range(hi - 1, driver.head - 1, -1))
+            else:
+                candidates = iter(range(end - 1, first - 1, -1))
+            out: list[Any] = []
+            for pos in candidates:
+                if pos < first:
+                    break
+                item = self._buf[(self._start + pos - first) % self.capacity]
+                if since is not None and (item.get("ts") or "") < since:
+                    return out[::-1], None
+                if all(self._key(item, f) == v for f, v in filters.items()):
+                    out.append(item)
+                    if len(out) == limit:
+                        return out[::-1], pos
+            return out[::-1], None
+
+    def facets(self, name: str) -> dict[Any, int]:
+        """Record count per key of an indexed field, over the in-memory window."""
+        with self.lock:
+            return {key: len(p) for key, p in self.indexes.get(name, {}).items()}
+
+    def tail(self, n: int) -> list[Any]:
+        with self.lock:
+            return self._tail(n)
+
+    def _tail(self, n: int) -> list[Any]:
+        n = min(n, self._size)
+        first = (self._start + self._size - n) % self.capacity
+        if first + n <= self.capacity:
+            return self._buf[first : first + n]
+        return self._buf[first:] + self._buf[: (first + n) % self.capacity]
+
+    def read(self, offset: int, limit: int) -> list[Any]:
+        """Return up to ``limit`` records starting at absolute index ``offset`` (0 = oldest since clear).
+
+        Records older than ``oldest`` are gone; the result then starts at ``oldest``.
+        """
+        with self.lock:
+            if self.spill_path is None or offset >= self.total - self._size:
+                return self._read(offset, limit)
+        # Spilled records: write out the queue first, so the files cover everything evicted.
+        with self._spill_lock, self.lock:
+            self._write_evicted()
+            return self._read(offset, limit)
+
+    def _read(self, offset: int, limit: int) -> list[Any]:
+        in_memory_from = self.total - self._size
+        out: list[Any] = []
+        if offset < in_memory_from and self.spill_path is not None:
+            if self._spill is not None:
+                self._spill.flush()
+            offset = max(offset, self._prev_from)
+            end = min(offset + limit, in_memory_from)
+            for path, first, last in ((self._prev_path, self._prev_from, self._cur_from), (self.spill_path, self._cur_from, self._written)):
+                lo, hi = max(offset, first), min(end, last)
+                if lo < hi and path.exists():
+                    with path.open("rb") as f:
+                        out.extend(loads(line) for line in islice(f, lo - first, hi - first))
+        start = max(offset, in_memory_from) - in_memory_from
+        count = min(limit - len(out), self._size - start)
+        if count > 0:
+            out.extend(self._tail(self._size - start)[:count])
+        return out
+
+    def clear(self) -> None:
+        with self._spill_lock, self.lock:
+            self._clear()
+            self.mutations += 1
+
+    def _clear(self) -> None:
+        self._buf = [None] * self.capacity
+        self.indexes = {f: {} for f in self.indexes}
+        self._start = 0
+        self._size = 0
+        self.total = 0
+        self._remove_spill()
+
+    @property
+    def _prev_path(self) -> Path:
+        return self.spill_path.with_name(f"{self.spill_path.stem}.prev.jsonl")
+
+    def _remove_spill(self) -> None:
+        self._evicted.clear()
+        self._spill_bytes = self._prev_from = self._cur_from = self._written = 0
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self.spill_path is not None:
+            self.spill_path.unlink(missing_ok=True)
+            self._prev_path.unlink(missing_ok=True)
+
+    def _evict(self, item: Any) -> None:
+        if self.spill_path is not None:
+            self._evicted.append(item)
+
+    def _flush_evicted(self) -> None:
+        with self._spill_lock:
+            self._write_evicted()
+
+    def _write_evicted(self) -> None:
+        """Append queued evictions in order; the caller holds ``_spill_lock``."""
+        while self._evicted:
+            line = dumps_line(self._evicted.popleft())
+            if self._spill is None:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                self._spill = self.spill_path.open("ab")
+            elif self._spill_bytes >= HISTORY_SPILL_MAX_BYTES // 2:
+                self._spill.close()
+                os.replace(self.spill_path, self._prev_path)
+                self._spill = self.spill_path.open("wb")
+                self._prev_from, self._cur_from = self._cur_from, self._written
+                self._spill_bytes = 0
+            self._spill.write(line)
+            self._spill_bytes += len(line)
+            self._written += 1
+
+
+def history(name: str) -> RingBuffer:
+    spill = SPILL_DIR / f"{name}.jsonl" if name in HISTORY_SPILL else None
+    return RingBuffer(HISTORY_LIMITS[name], spill, name, HISTORY_INDEXES.get(name, ()))
+
+
+@dataclass
+class StateDelta:
+    """State changes accumulated outside the lock and merged by ``RuntimeState.apply``.
+
+    Producers (chain threads, load-generator processes) build one delta per batch,
+    so each history lock is taken once per batch and counters are bumped once.
+    The delta is plain data and pickles across process boundaries.
+    """
+
+    counters: dict[str, int] = field(default_factory=lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    techniques: dict[tuple[str, str], int] = field(default_factory=dict)  # (technique, metric) -> n
+    replay_events: list[dict[str, Any]] = field(default_factory=list)
+    attack_timeline: list[dict[str, Any]] = field(default_factory=list)
+    alerts: list[dict[str, Any]] = field(default_factory=list)
+    ml_confidence: list[dict[str, Any]] = field(default_factory=list)
+
+
+HISTORY_NAMES = ("ml_confidence", "attack_timeline", "alerts", "replay_events")
+CONFIG_FIELDS = ("running", "mode", "anonymize_logs", "pcap_enabled")
+
 
 @dataclass
 class RuntimeState:
+    """Live lab state, split into independently synchronized parts.
+
+    Config fields are plain attributes written through ``configure`` under their own
+    lock, counters are per-thread shards, and each history has its own lock, so a
+    simulation thread appending alerts never waits on one reading replay events.
+    A snapshot reads each part under that part's own lock only, so it is
+    consistent per part rather than across parts.
+    """
+
     running: bool = False
     mode: str = "legacy"
     anonymize_logs: bool = True
     pcap_enabled: bool = True
-    false_positives: int = 0
-    evasion_attempts: int = 0
-    evasion_success: int = 0
-    attack_count: int = 0
-    alert_count: int = 0
-    ml_confidence: list[dict[str, Any]] = field(default_factory=list)
-    attack_timeline: list[dict[str, Any]] = field(default_factory=list)
-    alerts: list[dict[str, Any]] = field(default_factory=list)
-    replay_events: list[dict[str, Any]] = field(default_factory=list)
-    mitre_coverage: dict[str, int] = field(default_factory=lambda: {"T1078": 0, "T1003": 0, "T1021": 0, "BRUTE": 0, "EVASION": 0})
-    lock: threading.Lock = field(default_factory=threading.Lock)
+    counts: ShardedCounters = field(default_factory=lambda: ShardedCounters(COUNTER_FIELDS))
+    techniques: ShardedCounters = field(
+        default_factory=lambda: ShardedCounters(tuple((t, m) for t in TECHNIQUES for m in TECHNIQUE_METRICS))
+    )
+    ml_confidence: RingBuffer = field(default_factory=lambda: history("ml_confidence"))
+    attack_timeline: RingBuffer = field(default_factory=lambda: history("attack_timeline"))
+    alerts: RingBuffer = field(default_factory=lambda: history("alerts"))
+    replay_events: RingBuffer = field(default_factory=lambda: history("replay_events"))
+    config_lock: ContentionLock = field(default_factory=lambda: ContentionLock("config"))
+    config_version: int = 0
+    _snapshot: tuple[int, dict[str, Any]] | None = field(default=None, repr=False)
+
+    def configure(self, **changes: Any) -> None:
+        """Update config fields (mode, anonymize_logs, running, pcap_enabled) atomically."""
+        unknown = set(changes) - set(CONFIG_FIELDS)
+        if unknown:
+            raise AttributeError(f"not a config field: {', '.join(sorted(unknown))}")
+        with self.config_lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.config_version += 1
+
+    @property
+    def version(self) -> int:
+        """Sum of every part's change count: moves whenever any part of the state changes."""
+        histories = sum(getattr(self, name).mutations for name in HISTORY_NAMES)
+        return self.config_version + self.counts.writes() + self.techniques.writes() + histories
 
     def snapshot(self) -> dict[str, Any]:
-        with self.lock:
-            return {
-                "running": self.running,
-                "mode": self.mode,
-                "anonymize_logs": self.anonymize_logs,
-                "pcap_enabled": self.pcap_enabled,
-                "false_positives": self.false_positives,
-                "evasion_attempts": self.evasion_attempts,
-                "evasion_success": self.evasion_success,
-                "attack_count": self.attack_count,
-                "alert_count": self.alert_count,
-                "ml_confidence": self.ml_confidence[-200:],
-                "attack_timeline": self.attack_timeline[-300:],
-                "alerts": self.alerts[-300:],
-                "replay_events": self.replay_events[-500:],
-                "mitre_coverage": self.mitre_coverage,
-            }
+        """Return an immutable view of the state; callers must not modify it.
+
+        The cached snapshot is reused while no part has changed since it was built.
+        The version is read before the parts, so a change racing the build only
+        causes an extra rebuild, never a stale cache hit.
+        """
+        version = self.version
+        cached = self._snapshot
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        snap = {
+            **self._config(),
+            **self.counts.totals(),
+            "ml_confidence": tuple(self.ml_confidence.tail(200)),
+            "attack_timeline": tuple(self.attack_timeline.tail(300)),
+            "alerts": tuple(self.alerts.tail(300)),
+            "replay_events": tuple(self.replay_events.tail(500)),
+            "mitre_coverage": self.mitre_coverage(),
+            "version": version,
+        }
+        self._snapshot = (version, snap)
+        return snap
+
+    def apply(self, delta: StateDelta) -> None:
+        self.counts.add(delta.counters)
+        self.techniques.add(delta.techniques)
+        for name in HISTORY_NAMES:
+            getattr(self, name).extend(getattr(delta, name))
+
+    def counters(self) -> dict[str, Any]:
+        """Scalar counters only: the cheap part of the state that telemetry deltas carry."""
+        out = self._config()
+        del out["pcap_enabled"]
+        out.update(self.counts.totals())
+        out["mitre_coverage"] = self.mitre_coverage()
+        out["version"] = self.version
+        return out
+
+    def technique_stats(self) -> dict[str, dict[str, int]]:
+        """Executed/detected/false-positive tallies per technique over the full history."""
+        totals = self.techniques.totals()
+        return {t: {m: totals[(t, m)] for m in TECHNIQUE_METRICS} for t in TECHNIQUES}
+
+    def mitre_coverage(self) -> dict[str, int]:
+        totals = self.techniques.totals()
+        return {t: totals[(t, "executed")] for t in MITRE_TECHNIQUES}
+
+    def lock_stats(self) -> dict[str, Any]:
+        return {
+            "config": self.config_lock.stats(),
+            "histories": {name: getattr(self, name).lock.stats() for name in HISTORY_NAMES},
+            "counters": self.counts.stats(),
+            "techniques": self.techniques.stats(),
+        }
 
     def clear(self) -> None:
-        with self.lock:
-            self.false_positives = 0
-            self.evasion_attempts = 0
-            self.evasion_success = 0
-            self.attack_count = 0
-            self.alert_count = 0
-            self.ml_confidence.clear()
-            self.attack_timeline.clear()
-            self.alerts.clear()
-            self.replay_events.clear()
-            self.mitre_coverage = {"T1078": 0, "T1003": 0, "T1021": 0, "BRUTE": 0, "EVASION": 0}
+        self.counts.reset()
+        self.techniques.reset()
+        for name in HISTORY_NAMES:
+            getattr(self, name).clear()
+
+    def _config(self) -> dict[str, Any]:
+        with self.config_lock:
+            return {name: getattr(self, name) for name in CONFIG_FIELDS}
+
+
+class Subscriber:
+    """One WebSocket connection with its own bounded send queue and sender task."""
+
+    def __init__(self, ws: WebSocket, maxsize: int):
+        self.ws = ws
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self.task: asyncio.Task | None = None
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
 
 
 class TelemetryHub:
-    def __init__(self, state: RuntimeState):
+    """Fans telemetry out to WebSocket clients as one snapshot followed by sequence-numbered deltas.
+
+    Every published message gets the next ``seq``, is encoded to JSON once, and is kept
+    in ``_buffer``. Each connection drains its own bounded queue, so a slow client only
+    falls behind itself; when its queue is full ``slow_client_policy`` decides whether
+    to drop its oldest message or disconnect it. A client that notices a gap sends
+    ``{"op": "resync", "since": <last seq>}`` and gets the missing deltas from the
+    buffer, or a fresh snapshot if they have been evicted.
+    """
+
+    def __init__(
+        self,
+        state: RuntimeState,
+        queue_size: int = TELEMETRY_QUEUE_SIZE,
+        slow_client_policy: str = TELEMETRY_SLOW_CLIENT_POLICY,
+    ):
         self.state = state
-        self.connections: set[WebSocket] = set()
+        self.connections: dict[WebSocket, Subscriber] = {}
         self.loop: asyncio.AbstractEventLoop | None = None
-        self._buffer: deque[dict[str, Any]] = deque(maxlen=1000)
+        self.queue_size = queue_size
+        self.slow_client_policy = slow_client_policy
+        self._buffer: deque[tuple[int, str]] = deque(maxlen=1000)
+        self._seq = 0
+        self._lock = ContentionLock("telemetry")
+        self.published = 0
+        self.slow_disconnects = 0
 
     def set_loop(self, loop: asyncio.AbstractEventLoop) -> None:
         self.loop = loop
 
     async def connect(self, ws: WebSocket) -> None:
         await ws.accept()
-        self.connections.add(ws)
+        sub = Subscriber(ws, self.queue_size)
+        sub.task = asyncio.create_task(self._drain(sub))
+        self.connections[ws] = sub
+        self.send_snapshot(ws)
 
     def disconnect(self, ws: WebSocket) -> None:
-        self.connections.discard(ws)
+        sub = self.connections.pop(ws, None)
+        if sub and sub.task and sub.task is not asyncio.current_task():
+            sub.task.cancel()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
 
     def publish(self, event: dict[str, Any]) -> None:
-        self._buffer.append(event)
-        if self.loop:
-            asyncio.run_coroutine_threadsafe(self._broadcast(event), self.loop)
+        # Serialize outside the lock; only the seq number is spliced in under it.
+        body = dumps_object(event)[:-1].decode("utf-8")
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            msg = f'{body},"seq":{seq}}}'
+            self._buffer.append((seq, msg))
+            self.published += 1
+            # Scheduled under the lock so the loop runs fanouts in seq order across publishing threads.
+            if self.loop and self.connections:
+                self.loop.call_soon_threadsafe(self._fanout, msg)
+
+    def send_snapshot(self, ws: WebSocket) -> None:
+        sub = self.connections.get(ws)
+        if sub is None:
+            return
+        msg = dumps({"kind": "snapshot", "seq": self._seq, "snapshot": self.state.snapshot()}).decode("utf-8")
+        # A snapshot supersedes anything still queued for this client.
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        self._enqueue(sub, msg)
 
-    async def _broadcast(self, event: dict[str, Any]) -> None:
-        if not self.connections:
+    def resync(self, ws: WebSocket, since: int | None) -> None:
+        """Queue buffered deltas after ``since``, or fall back to a full snapshot."""
+        sub = self.connections.get(ws)
+        if sub is None:
+            return
+        with self._lock:
+            missed = [msg for seq, msg in self._buffer if since is not None and seq > since]
+            first = next((seq for seq, _ in self._buffer if since is not None and seq > since), None)
+            complete = since is not None and (since >= self._seq or first == since + 1)
+        if not complete or len(missed) > self.queue_size - sub.queue.qsize():
+            self.send_snapshot(ws)
             return
-        msg = json.dumps(event)
-        stale: list[WebSocket] = []
-        for ws in self.connections:
-            try:
-                await ws.send_text(msg)
-            except Exception:
-                stale.append(ws)
-        for ws in stale:
-            self.disconnect(ws)
+        for msg in missed:
+            self._enqueue(sub, msg)
+
+    def heartbeat(self, ws: WebSocket) -> None:
+        sub = self.connections.get(ws)
+        if sub is not None:
+            self._enqueue(sub, dumps({"kind": "heartbeat", "seq": self._seq}).decode("utf-8"))
+
+    def stats(self) -> dict[str, Any]:
+        subs = [sub.stats() for sub in list(self.connections.values())]
+        return {
+            "connections": len(subs),
+            "seq": self._seq,
+            "published": self.published,
+            "queue_size": self.queue_size,
+            "slow_client_policy": self.slow_client_policy,
+            "slow_disconnects": self.slow_disconnects,
+            "max_depth": max((s["depth"] for s in subs), default=0),
+            "dropped": sum(s["dropped"] for s in subs),
+            "lock": self._lock.stats(),
+            "clients": subs,
+        }
+
+    def _fanout(self, msg: str) -> None:
+        for sub in list(self.connections.values()):
+            self._enqueue(sub, msg)
+
+    def _enqueue(self, sub: Subscriber, msg: str) -> None:
+        if sub.queue.full():
+            if self.slow_client_policy == "disconnect":
+                self.slow_disconnects += 1
+                self.disconnect(sub.ws)
+                asyncio.ensure_future(sub.ws.close(code=1013))
+                return
+            sub.queue.get_nowait()
+            sub.dropped += 1
+        sub.queue.put_nowait(msg)
+        sub.max_depth = max(sub.max_depth, sub.queue.qsize())
+
+    async def _drain(self, sub: Subscriber) -> None:
+        try:
+            while True:
+                msg = await sub.queue.get()
+                await sub.ws.send_text(msg)
+                sub.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(sub.ws)
@@ -29,9 +29,29 @@ def start_ws_listener() -> None:
         while True:
             try:
                 ws = create_connection(WS, timeout=10)
+                last_seq = None
+                resync_pending = False
                 while True:
                     raw = ws.recv()
                     msg = json.loads(raw)
+                    # One snapshot on connect, then deltas numbered by seq; ask for a resync on a gap.
+                    kind, seq = msg.get("kind"), msg.get("seq")
+                    if kind == "snapshot":
+                        last_seq, resync_pending = seq, False
+                    elif kind == "heartbeat":
+                        if last_seq is not None and seq > last_seq:
+                            ws.send(json.dumps({"op": "resync", "since": last_seq}))
+                            resync_pending = True
+                        continue
+                    elif last_seq is not None:
+                        if seq <= last_seq:
+                            continue
+                        if seq > last_seq + 1:
+                            if not resync_pending:
+                                ws.send(json.dumps({"op": "resync", "since": last_seq}))
+                                resync_pending = True
+                            continue
+                        last_seq, resync_pending = seq, False
                     buf = st.session_state.live_messages
                     buf.append(msg)
                     if len(buf) > 300:
@@ -84,15 +104,17 @@ with st.sidebar:
 
 metrics = api_get("/get_metrics")
 coverage = api_get("/coverage")
-alerts = api_get("/get_alerts").get("alerts", [])
-replay = api_get("/replay").get("events", [])
+# Fetch only what the panels render; the backend filters and pages through its indexes.
+alerts = api_get("/alerts?limit=100").get("alerts", [])
+ml_alerts = api_get("/alerts?detector=ml_isolation_forest_sim&limit=40").get("alerts", [])
+replay = api_get("/events?limit=200").get("events", [])
 timeline = coverage.get("summary", [])
 
 k1, k2, k3, k4, k5 = st.columns(5)
 k1.metric("Simulation", "RUNNING" if metrics.get("running") else "IDLE")
 k2.metric("CPU %", f"{metrics.get('cpu_percent', 0):.1f}")
 k3.metric("Memory %", f"{metrics.get('memory_percent', 0):.1f}")
-k4.metric("Network MB", metrics.get("network_mbps", 0))
+k4.metric("Network Mbps", metrics.get("network_mbps", 0))
 k5.metric("PCAP Capture", "ON" if metrics.get("pcap_enabled") else "OFF")
 
 c1, c2 = st.columns([2, 1])
@@ -107,7 +129,7 @@ with c2:
     st.subheader("False Positive Rate")
     st.metric("FPR %", f"{metrics.get('false_positive_rate', 0):.2f}")
     st.subheader("ML Anomaly Confidence")
-    conf = [a.get("ml_confidence", 0.0) for a in alerts if "ml_confidence" in a][-40:]
+    conf = [a.get("ml_confidence", 0.0) for a in ml_alerts]
     if conf:
         st.line_chart(pd.DataFrame({"confidence": conf}))
     else:
@@ -140,7 +162,7 @@ s1, s2 = st.columns(2)
 with s1:
     st.subheader("Active Alerts Panel")
     if alerts:
-        st.dataframe(pd.DataFrame(alerts).tail(100), use_container_width=True, height=300)
+        st.dataframe(pd.DataFrame(alerts), use_container_width=True, height=300)
     else:
         st.info("No alerts yet.")
 with s2:
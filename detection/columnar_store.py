@@ -0,0 +1,340 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from jsonio import dumps, loads
+from jsonl_tail import follow_renames, is_archive, is_stale, list_files, load_checkpoint, read_new_lines, save_checkpoint
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow every reader falls back to the JSONL files
+    pa = pc = pq = None
+
+STORE_DIR = "/data/columnar"
+
+# Compaction rolls a file's complete lines into Parquet once COMPACT_MIN_BYTES are
+# pending, or whatever is pending once COMPACT_MAX_AGE seconds have passed since
+# the last roll, so parts stay large without letting the JSONL tail grow unbounded.
+COMPACT_MIN_BYTES = int(os.getenv("COMPACT_MIN_BYTES", str(8 * 1024 * 1024)))
+COMPACT_MAX_AGE = float(os.getenv("COMPACT_MAX_AGE_SECONDS", "300"))
+COMPACT_CHUNK_BYTES = 32 * 1024 * 1024
+
+# Typed columns per dataset. Events follow simulation_engine._base_event /
+# _noise_event and attack_chain_sim.emit_chain; keys outside the schema, or values
+# of an unexpected type, are kept as a JSON object in the ``extra`` column.
+EVENT_COLUMNS = (
+    ("id", "string"),
+    ("ts", "string"),
+    ("event_type", "string"),
+    ("technique", "string"),
+    ("attack_id", "string"),
+    ("step_number", "int32"),
+    ("total_steps", "int32"),
+    ("action", "string"),
+    ("adversary_profile", "string"),
+    ("src_ip", "string"),
+    ("dst_ip", "string"),
+    ("host", "string"),
+    ("target_host", "string"),
+    ("username", "string"),
+    ("proto", "string"),
+    ("result", "string"),
+    ("mitre", "string"),
+    ("marker", "string"),
+    ("marker_encoding", "string"),
+    ("evasion_mode", "bool"),
+    ("false_positive_candidate", "bool"),
+    ("containerized_victim", "bool"),
+    ("ad_simulated", "bool"),
+    ("network_namespace", "string"),
+    ("note", "string"),
+)
+# Only events: the alert files are derived outputs, several rewritten in place
+# (re-scores, anonymization), and nothing scans them from Parquet.
+DATASETS = {
+    "events": ("/data/events/*.jsonl", EVENT_COLUMNS),
+}
+EXTRA = "extra"
+
+_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "int32": lambda v: isinstance(v, int) and not isinstance(v, bool) and -(2**31) <= v < 2**31,
+    "bool": lambda v: isinstance(v, bool),
+}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def now_ts() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def manifest_path(dataset: str) -> str:
+    return os.path.join(STORE_DIR, dataset, "_manifest.json")
+
+
+def load_manifest(dataset: str) -> dict:
+    manifest = load_checkpoint(manifest_path(dataset))
+    manifest.setdefault("files", {})
+    manifest.setdefault("parts", [])
+    return manifest
+
+
+def _arrow_type(kind: str):
+    return {"string": pa.string, "int32": pa.int32, "bool": pa.bool_}[kind]()
+
+
+def to_table(records: list, columns) -> "pa.Table":
+    """Build a typed table from parsed records; anything off-schema lands in ``extra``."""
+    known = {name for name, _ in columns}
+    extras = [{k: v for k, v in r.items() if k not in known} for r in records]
+    arrays = []
+    for name, kind in columns:
+        values = [r.get(name) for r in records]
+        try:
+            arrays.append(pa.array(values, type=_arrow_type(kind)))
+            continue
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            pass
+        check = _CHECKS[kind]
+        for i, v in enumerate(values):
+            if v is not None and not check(v):
+                extras[i][name] = v
+                values[i] = None
+        arrays.append(pa.array(values, type=_arrow_type(kind)))
+    arrays.append(pa.array([dumps(x).decode("utf-8") if x else None for x in extras], type=pa.string()))
+    names = [name for name, _ in columns] + [EXTRA]
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def partition_of(ts) -> str:
+    """Hour partition key, ``YYYY-MM-DDTHH``, or ``unknown`` for records without a usable ts."""
+    if isinstance(ts, str) and len(ts) >= 13 and ts[10] == "T":
+        return ts[:13]
+    return "unknown"
+
+
+def partition_dir(partition: str) -> str:
+    if partition == "unknown":
+        return "date=unknown"
+    return os.path.join(f"date={partition[:10]}", f"hour={partition[11:13]}")
+
+
+def write_part(dataset: str, rel: str, table) -> None:
+    path = os.path.join(STORE_DIR, dataset, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def rekey_parts(manifest: dict, moved: dict) -> None:
+    for part in manifest["parts"]:
+        part["source"] = moved.get(part["source"], part["source"])
+
+
+def drop_source(dataset: str, manifest: dict, source: str) -> int:
+    """Forget the parts rolled from ``source``; its JSONL was deleted, truncated or replaced."""
+    keep = []
+    dropped = 0
+    for part in manifest["parts"]:
+        if part["source"] != source:
+            keep.append(part)
+            continue
+        dropped += 1
+        try:
+            os.unlink(os.path.join(STORE_DIR, dataset, part["path"]))
+        except FileNotFoundError:
+            pass
+    manifest["parts"] = keep
+    manifest["files"].pop(source, None)
+    return dropped
+
+
+def pending_bytes(path: str, size: int, entry: dict | None) -> int:
+    """Bytes not yet rolled; an archive counts its compressed size until it has been read to the end."""
+    entry = entry or {}
+    if is_archive(path):
+        return 0 if entry.get("eof") else size
+    return max(size - entry.get("offset", 0), 0)
+
+
+def compact_dataset(dataset: str, force: bool = False) -> dict:
+    pattern, columns = DATASETS[dataset]
+    manifest = load_manifest(dataset)
+    files = manifest["files"]
+    dropped = 0
+
+    paths = list_files(pattern)
+    # A sealed segment is the active file renamed, and an archive is a sealed segment
+    # compressed: its rows and offset move with it.
+    moved, held = follow_renames(files, paths)
+    rekey_parts(manifest, moved)
+    changed = bool(moved)
+    sizes = {}
+    for p in paths:
+        if p in held:
+            continue  # mid-rotation or mid-compression: rolled once the entry has moved
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            continue
+        entry = files.get(p)
+        if entry and is_stale(p, entry, st):
+            dropped += drop_source(dataset, manifest, p)
+        sizes[p] = st.st_size
+    for p in list(files):
+        if p not in sizes and p not in held.values():
+            dropped += drop_source(dataset, manifest, p)
+
+    pending = sum(pending_bytes(p, size, files.get(p)) for p, size in sizes.items())
+    age = time.time() - manifest.get("compacted_at", 0)
+    if not dropped and (not pending or (not force and pending < COMPACT_MIN_BYTES and age < COMPACT_MAX_AGE)):
+        if changed:
+            save_checkpoint(manifest_path(dataset), manifest)
+        return {"rows": 0, "parts": 0, "pending_bytes": pending, "dropped": 0}
+
+    rows = 0
+    written = 0
+    for p, size in sizes.items():
+        while True:
+            entry = files.get(p)
+            start = (entry or {}).get("offset", 0)
+            if not pending_bytes(p, size, entry):
+                break  # stop at the size seen above rather than chase a file still being appended
+            try:
+                lines, entry = read_new_lines(p, entry, COMPACT_CHUNK_BYTES)
+            except FileNotFoundError:
+                break
+            if entry["offset"] == start:
+                files[p] = entry  # an exhausted archive is marked eof so it is not decompressed again
+                break
+            by_partition = {}
+            for line in lines:
+                try:
+                    record = loads(line)
+                except json.JSONDecodeError:
+                    continue
+                by_partition.setdefault(partition_of(record.get("ts")), []).append(record)
+            stem = os.path.splitext(os.path.basename(p))[0]
+            for partition, records in by_partition.items():
+                # Named after the byte offset the batch starts at, so re-running an
+                # uncommitted pass overwrites its parts instead of duplicating rows.
+                rel = os.path.join(partition_dir(partition), f"{stem}-{entry['inode']}-{start}.parquet")
+                write_part(dataset, rel, to_table(records, columns))
+                stamps = [r["ts"] for r in records if isinstance(r.get("ts"), str)]
+                manifest["parts"].append(
+                    {
+                        "path": rel,
+                        "source": p,
+                        "partition": partition,
+                        "rows": len(records),
+                        "min_ts": min(stamps) if stamps else None,
+                        "max_ts": max(stamps) if stamps else None,
+                    }
+                )
+                rows += len(records)
+                written += 1
+            files[p] = entry
+
+    manifest["compacted_at"] = time.time()
+    manifest["updated"] = now_ts()
+    manifest["rows"] = sum(part["rows"] for part in manifest["parts"])
+    # Parts are on disk before the manifest names them; readers only trust the manifest.
+    save_checkpoint(manifest_path(dataset), manifest)
+    return {"rows": rows, "parts": written, "pending_bytes": 0, "dropped": dropped}
+
+
+def compact(state: dict | None = None, force: bool = False) -> dict:
+    """Roll complete JSONL lines of every dataset into hour-partitioned Parquet parts."""
+    if not available():
+        print("pyarrow not installed; skipping compaction")
+        return {"skipped": True}
+    result = {name: compact_dataset(name, force) for name in DATASETS}
+    summary = " ".join(f"{name}={r['rows']}" for name, r in result.items())
+    print(f"columnar compaction {summary}")
+    return result
+
+
+def snapshot(dataset: str) -> dict:
+    """The committed manifest, restricted to sources whose JSONL is still the file that was rolled.
+
+    ``files`` holds jsonl_tail entries marking where the columnar copy ends, so a
+    reader scans the parts and then tails the JSONL from those offsets.
+    """
+    manifest = load_manifest(dataset)
+    files = {p: dict(entry) for p, entry in manifest["files"].items()}
+    moved, _ = follow_renames(files, list_files(DATASETS[dataset][0]))
+    live = {}
+    sources = set()
+    for p, entry in files.items():
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            continue
+        if not is_stale(p, entry, st):
+            live[p] = entry
+            sources.add(p)
+    parts = [part for part in manifest["parts"] if moved.get(part["source"], part["source"]) in sources]
+    return {"files": live, "parts": parts}
+
+
+def overlaps(part: dict, start: str | None, end: str | None) -> bool:
+    if start is None and end is None:
+        return True
+    if part["min_ts"] is None:
+        return False
+    if start is not None and part["max_ts"] < start:
+        return False
+    return end is None or part["min_ts"] < end
+
+
+def scan(dataset: str, columns=None, start: str | None = None, end: str | None = None, manifest: dict | None = None):
+    """Yield one table per committed part, reading only ``columns`` and rows with ``start <= ts < end``.
+
+    Parts whose time range misses the window are skipped without being opened, and
+    the ts filter is pushed into the Parquet reader so row groups outside it are
+    skipped from their statistics.
+    """
+    manifest = snapshot(dataset) if manifest is None else manifest
+    filters = []
+    if start is not None:
+        filters.append(("ts", ">=", start))
+    if end is not None:
+        filters.append(("ts", "<", end))
+    for part in manifest["parts"]:
+        if not overlaps(part, start, end):
+            continue
+        path = os.path.join(STORE_DIR, dataset, part["path"])
+        table = pq.read_table(path, columns=list(columns) if columns else None, filters=filters or None)
+        if table.num_rows:
+            yield table
+
+
+def column(table, name: str, default=None):
+    """A column as a NumPy object array, with nulls replaced by ``default``."""
+    col = table.column(name)
+    if default is not None:
+        col = pc.fill_null(col, default)
+    return col.to_numpy(zero_copy_only=False)
+
+
+def rows(table) -> list:
+    """Turn a scanned table back into event dicts: nulls dropped, ``extra`` keys restored."""
+    records = []
+    for r in table.to_pylist():
+        extra = r.pop(EXTRA, None)
+        record = {k: v for k, v in r.items() if v is not None}
+        if extra:
+            record.update(loads(extra))
+        records.append(record)
+    return records
+
+
+if __name__ == "__main__":
+    compact(force=True)
@@ -1,11 +1,90 @@
-﻿import subprocess
+﻿import json
+import os
+import sys
+import threading
 import time
+import traceback
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+for sub in ("ml", "privacy"):
+    sys.path.insert(0, os.path.join(BASE_DIR, sub))
+
+# Imported once for the lifetime of the service instead of once per stage per cycle.
+import anonymize
+import columnar_store
+import merge_alerts
+import rule_engine
+import score
+import train
+
+CYCLE_SECONDS = float(os.getenv("DETECTOR_CYCLE_SECONDS", "10"))
+# Streaming mode evaluates rules continuously in a background thread instead of once per cycle.
+RULE_ENGINE_STREAMING = os.getenv("RULE_ENGINE_STREAMING", "1") == "1"
+OUT_TIMINGS = "/data/alerts/detector_timings.json"
+
+STAGES = [
+    ("rule_engine", rule_engine.run),
+    ("train", train.run),
+    ("score", score.run),
+    ("merge_alerts", merge_alerts.run),
+    ("anonymize", anonymize.run),
+    ("compact", columnar_store.compact),
+]
+
+
+class DetectorPipeline:
+    """Runs every detection stage in-process, keeping per-stage state resident between cycles."""
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.state = {name: {} for name, _ in stages}
+        self.cycle = 0
+
+    def run_cycle(self) -> dict:
+        self.cycle += 1
+        started = time.perf_counter()
+        stages = {}
+        for name, fn in self.stages:
+            t0 = time.perf_counter()
+            try:
+                result = fn(self.state[name]) or {}
+                ok = True
+            except Exception:
+                traceback.print_exc()
+                # Drop resident state so the stage reloads from disk next cycle.
+                self.state[name] = {}
+                result = {}
+                ok = False
+            stages[name] = {"ok": ok, "seconds": round(time.perf_counter() - t0, 4), **result}
+        return {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "cycle": self.cycle,
+            "total_seconds": round(time.perf_counter() - started, 4),
+            "stages": stages,
+        }
+
+
+def write_timings(report: dict) -> None:
+    os.makedirs(os.path.dirname(OUT_TIMINGS), exist_ok=True)
+    tmp = f"{OUT_TIMINGS}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    os.replace(tmp, OUT_TIMINGS)
+
 
 if __name__ == "__main__":
+    stages = STAGES
+    streaming_state = {}
+    if RULE_ENGINE_STREAMING:
+        stages = [s for s in STAGES if s[0] != "rule_engine"]
+        threading.Thread(target=rule_engine.follow, args=(streaming_state,), daemon=True).start()
+    pipeline = DetectorPipeline(stages)
     while True:
-        subprocess.run(["python", "/app/rule_engine.py"], check=False)
-        subprocess.run(["python", "/app/ml/train.py"], check=False)
-        subprocess.run(["python", "/app/ml/score.py"], check=False)
-        subprocess.run(["python", "/app/merge_alerts.py"], check=False)
-        subprocess.run(["python", "/app/privacy/anonymize.py"], check=False)
-        time.sleep(10)
+        report = pipeline.run_cycle()
+        if RULE_ENGINE_STREAMING:
+            report["rule_engine_stream"] = dict(streaming_state.get("stream", {}))
+        write_timings(report)
+        timings = " ".join(f"{name}={s['seconds']}s" for name, s in report["stages"].items())
+        print(f"detector cycle={report['cycle']} total={report['total_seconds']}s {timings}", flush=True)
+        time.sleep(max(0.0, CYCLE_SECONDS - report["total_seconds"]))
@@ -0,0 +1,236 @@
+import glob
+import gzip
+import json
+import os
+import re
+import zlib
+
+from jsonio import loads
+
+try:
+    import zstandard
+except ImportError:  # only needed when the backend compresses segments with SEGMENT_COMPRESSION=zstd
+    zstandard = None
+
+# Partial lines are carried over as latin-1 text so the checkpoint can hold any
+# byte sequence (including a split UTF-8 character) and restore it exactly.
+CARRY_ENCODING = "latin-1"
+
+# A sealed segment of the stream whose active file is ``<stream>.jsonl`` (backend segments.SEALED).
+SEALED = re.compile(r"^(?P<stream>.+)\.(?P<stamp>\d{8}T\d{6}Z)-(?P<seq>\d{6})\.jsonl$")
+# Sealed segments the backend has compressed; immutable, offsets count uncompressed bytes.
+ARCHIVE_SUFFIXES = (".gz", ".zst")
+# A file is also identified by a checksum of its first HEAD_BYTES: /lab/reset deletes
+# and recreates files, and the new one often gets the old inode back.
+HEAD_BYTES = 64
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def is_archive(path: str) -> bool:
+    return path.endswith(ARCHIVE_SUFFIXES)
+
+
+def list_files(pattern: str) -> list[str]:
+    """Files matching a ``*.jsonl`` pattern plus their compressed segments, in name order."""
+    paths = glob.glob(pattern)
+    for suffix in ARCHIVE_SUFFIXES:
+        paths.extend(glob.glob(pattern + suffix))
+    return sorted(paths)
+
+
+def open_segment(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise OSError(f"zstandard is not installed; cannot read {path}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def is_replaced(path: str, entry: dict, st: os.stat_result) -> bool:
+    """``entry`` no longer describes ``path`` by its stat: new inode, or truncated below its offset."""
+    if entry.get("inode") != st.st_ino:
+        return True
+    return not is_archive(path) and st.st_size < entry.get("offset", 0)
+
+
+def same_head(head: bytes, entry: dict) -> bool:
+    """``head`` (a file's first bytes) begins like the file ``entry`` was read from."""
+    n = entry.get("head_len")
+    return n is None or (len(head) >= n and zlib.crc32(head[:n]) == entry["head"])
+
+
+def is_stale(path: str, entry: dict, st: os.stat_result) -> bool:
+    """``entry`` no longer describes ``path``: replaced, truncated, or recreated on a reused inode."""
+    if is_replaced(path, entry, st):
+        return True
+    if is_archive(path) or "head_len" not in entry:
+        return False
+    try:
+        with open(path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+    except FileNotFoundError:
+        return False  # renamed since the stat; follow_renames settles it on the next pass
+    return not same_head(head, entry)
+
+
+def read_new_lines(path: str, entry: dict | None, max_bytes: int | None = None) -> tuple[list[bytes], dict]:
+    """Return complete lines appended to ``path`` since ``entry`` and the updated entry.
+
+    A changed inode (rotation, delete + recreate), a file shorter than the stored
+    offset (truncation) or different first bytes (recreated on the same inode)
+    restart the file from byte zero. ``max_bytes``
+    caps how much is read per call; the remainder is picked up by the next call.
+    Compressed segments are read through the decompressor and marked ``eof`` once
+    exhausted, so later calls do not decompress them again.
+    """
+    st = os.stat(path)
+    entry = dict(entry or {})
+    if is_replaced(path, entry, st):
+        entry = {"inode": st.st_ino, "offset": 0, "carry": ""}
+
+    archive = is_archive(path)
+    offset = entry["offset"]
+    if entry.get("eof") or (not archive and st.st_size == offset):
+        return [], entry
+
+    with open_segment(path) as f:
+        if not archive:
+            head = f.read(HEAD_BYTES)
+            if not same_head(head, entry):
+                entry = {"inode": st.st_ino, "offset": 0, "carry": ""}
+                offset = 0
+            if len(head) > entry.get("head_len", 0):
+                entry["head"] = zlib.crc32(head)
+                entry["head_len"] = len(head)
+        f.seek(offset)
+        chunk = f.read(max_bytes or -1)
+
+    data = entry.get("carry", "").encode(CARRY_ENCODING) + chunk
+    complete, _, partial = data.rpartition(b"\n")
+    lines = complete.split(b"\n") if complete else []
+    entry["offset"] = offset + len(chunk)
+    entry["carry"] = partial.decode(CARRY_ENCODING)
+    if archive and (max_bytes is None or len(chunk) < max_bytes):
+        entry["eof"] = True
+    return lines, entry
+
+
+def is_rotation(old: str, new: str) -> bool:
+    """``new`` is a sealed segment of the stream whose active file is ``old``."""
+    m = SEALED.match(os.path.basename(new))
+    return (
+        m is not None
+        and old.endswith(".jsonl")
+        and os.path.dirname(old) == os.path.dirname(new)
+        and m["stream"] == os.path.basename(old)[: -len(".jsonl")]
+    )
+
+
+def follow_renames(files: dict, paths: list) -> tuple[dict, dict]:
+    """Move active-file entries onto the segment their file was sealed into.
+
+    The backend seals a full ``<stream>.jsonl`` by renaming it to
+    ``<stream>.<stamp>-<seq>.jsonl`` and starting a fresh file under the old name,
+    so a reader mid-way through the file keeps its offset on the segment and reads
+    the new file from byte zero. Inodes are reused once a file is unlinked, so an
+    entry only moves when the rename is that rotation: an active file onto an
+    untracked, same-stream segment at least as long as the entry's offset, with the
+    active path present again. A sealed segment that vanished is followed by name
+    onto the ``.gz``/``.zst`` archive compression replaced it with, keeping its
+    (uncompressed) offset; archives themselves never move.
+
+    Returns ``({old_path: new_path}, held)``. ``held`` maps segments to their active
+    path when that path is absent right now, between the writer's rename and its
+    re-creation. The caller should skip those segments and keep the active entry
+    for this pass rather than read the segment from byte zero.
+    """
+    stats = {}
+    for p in paths:
+        try:
+            stats[p] = os.stat(p)
+        except FileNotFoundError:
+            continue
+    untracked = {st.st_ino: p for p, st in stats.items() if p not in files}
+    moved = {}
+    held = {}
+    for p, e in files.items():
+        if p not in stats and not os.path.exists(p):
+            q = compressed_as(p, stats, files)
+            if q is not None:
+                moved[p] = q
+                continue
+        q = untracked.get(e.get("inode"))
+        if q is None or q in moved.values() or is_archive(p) or not is_rotation(p, q):
+            continue
+        if stats[q].st_size < e.get("offset", 0):
+            continue
+        if p not in stats and not os.path.exists(p):
+            held[q] = p
+            continue
+        moved[p] = q
+    for p, q in moved.items():
+        entry = files.pop(p)
+        if is_archive(q):
+            entry["inode"] = stats[q].st_ino
+        files[q] = entry
+    for q in stats:
+        # compress() writes the archive before unlinking the plain segment; while both
+        # exist, the plain copy is the one being read.
+        if is_archive(q) and q not in files and q[: q.rindex(".")] in stats:
+            held[q] = q[: q.rindex(".")]
+    return moved, held
+
+
+def compressed_as(path: str, stats: dict, files: dict) -> str | None:
+    """The untracked archive a vanished plain segment was compressed into, if any."""
+    if is_archive(path) or not SEALED.match(os.path.basename(path)):
+        return None
+    for suffix in ARCHIVE_SUFFIXES:
+        if path + suffix in stats and path + suffix not in files:
+            return path + suffix
+    return None
+
+
+def read_new_records(pattern: str, files: dict, max_bytes: int | None = None) -> list[dict]:
+    """Parse JSONL records appended to files matching ``pattern`` (and their compressed segments);
+    ``files`` is updated in place."""
+    records = []
+    seen = set()
+    paths = list_files(pattern)
+    _, held = follow_renames(files, paths)
+    for p in paths:
+        if p in held:
+            continue
+        try:
+            lines, files[p] = read_new_lines(p, files.get(p), max_bytes)
+        except FileNotFoundError:
+            continue
+        seen.add(p)
+        for line in lines:
+            try:
+                records.append(loads(line))
+            except json.JSONDecodeError:
+                continue
+    for p in list(files):
+        if p not in seen and p not in held.values():
+            del files[p]
+    return records
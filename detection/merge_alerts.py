@@ -1,27 +1,176 @@
-﻿import json
-import os
+﻿import os
+from collections import OrderedDict
+
+from jsonio import dumps_line
+from jsonl_tail import is_stale, load_checkpoint, read_new_records, save_checkpoint
 
 RULE = "/data/alerts/rule_alerts.jsonl"
 ML = "/data/alerts/ml_alerts.jsonl"
 OUT = "/data/alerts/combined_alerts.jsonl"
+MERGE_STATE = "/data/state/merge_checkpoint.json"
+
+# Dedup window: (detector, source_event_id) keys remembered across passes. Bounded so
+# memory and checkpoint size stay constant however long the alert history grows.
+SEEN_LIMIT = 20_000
+CHUNK_BYTES = 8 * 1024 * 1024
+# Rule alerts stream in as events arrive while ML alerts come with the next scoring
+# pass. Every alert is written as soon as it is read; the source event ids of the
+# last PAIR_LIMIT unpaired alerts are kept so a partner arriving in a later pass is
+# still recorded as a correlation.
+PAIR_LIMIT = 5_000
+
+
+def alert_key(alert: dict):
+    event_id = alert.get("source_event_id")
+    if event_id is None:
+        return None
+    return f"{alert.get('detector')}:{event_id}"
+
+
+def correlate(rule: dict, ml: dict) -> dict:
+    """Fold an ML anomaly into the rule alert raised for the same source event."""
+    combined = dict(rule)
+    for k, v in ml.items():
+        combined.setdefault(k, v)
+    combined["detector"] = rule.get("detector")
+    combined["detectors"] = [rule.get("detector"), ml.get("detector")]
+    combined["ml_detected"] = bool(ml.get("detected"))
+    return combined
+
+
+def replaced(inputs: dict) -> bool:
+    """An input was rewritten under the merged offsets (ML re-score, rule-engine rebuild)."""
+    for path, entry in [*inputs["rule"].items(), *inputs["ml"].items()]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return True
+        if is_stale(path, entry, st):
+            return True
+    return False
+
+
+def late_correlation(ml: dict, rule_detector: str) -> dict:
+    """Record that ``ml`` pairs with a rule alert already written in an earlier pass."""
+    record = dict(ml)
+    record["alert_type"] = "correlation"
+    record["detectors"] = [rule_detector, ml.get("detector")]
+    record["ml_detected"] = bool(ml.get("detected"))
+    return record
+
 
+def merge_batch(rules: list, mls: list, seen: OrderedDict, partners: OrderedDict) -> list:
+    """Deduplicate new alerts against ``seen`` and pair rule/ML alerts sharing a source event.
 
-def read_jsonl(path: str):
-    if not os.path.exists(path):
-        return []
+    ``partners`` maps the source event id of recently written, unpaired alerts to
+    ``[kind, detector]``: a rule alert whose ML partner was written earlier is folded
+    as usual, and an ML alert whose rule partner was written earlier becomes a
+    ``correlation`` record.
+    """
+
+    def fresh(alert):
+        key = alert_key(alert)
+        if key is None:
+            return True
+        if key in seen:
+            return False
+        seen[key] = None
+        if len(seen) > SEEN_LIMIT:
+            seen.popitem(last=False)
+        return True
+
+    def earlier(kind, event_id):
+        found = partners.get(event_id)
+        if found is None or found[0] != kind:
+            return None
+        del partners[event_id]
+        return found[1]
+
+    def remember(kind, alert):
+        partners[alert["source_event_id"]] = [kind, alert.get("detector")]
+        partners.move_to_end(alert["source_event_id"])
+        if len(partners) > PAIR_LIMIT:
+            partners.popitem(last=False)
+
+    ml_by_event = {}
     rows = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                rows.append(json.loads(line))
-            except json.JSONDecodeError:
-                continue
+    for a in mls:
+        if not fresh(a):
+            continue
+        if a.get("source_event_id") is None:
+            rows.append(a)
+        else:
+            ml_by_event[a["source_event_id"]] = a
+
+    for a in rules:
+        if not fresh(a):
+            continue
+        event_id = a.get("source_event_id")
+        if event_id is None:
+            rows.append(a)
+            continue
+        ml = ml_by_event.pop(event_id, None)
+        if ml is None:
+            ml_detector = earlier("ml", event_id)
+            ml = {"detector": ml_detector, "detected": True} if ml_detector else None
+        if ml is None:
+            remember("rule", a)
+        rows.append(correlate(a, ml) if ml else a)
+
+    for event_id, a in ml_by_event.items():
+        rule_detector = earlier("rule", event_id)
+        if rule_detector is None:
+            remember("ml", a)
+        rows.append(late_correlation(a, rule_detector) if rule_detector else a)
     return rows
 
 
+def run(state: dict | None = None) -> dict:
+    """Append newly arrived rule and ML alerts to the combined stream.
+
+    When an input is rewritten rather than appended to (score.py swaps in a full
+    re-score on a new model version), the combined stream is rebuilt from both
+    inputs, since the dedup window cannot tell which re-read alerts were merged.
+    """
+    state = {} if state is None else state
+    progress = state.get("progress") or load_checkpoint(MERGE_STATE)
+    rebuild = not progress or not os.path.exists(OUT) or replaced(progress["inputs"])
+    if rebuild:
+        progress = {"inputs": {"rule": {}, "ml": {}}, "seen": [], "partners": []}
+    seen = state.get("seen")
+    if seen is None or rebuild:
+        seen = OrderedDict.fromkeys(progress["seen"])
+    partners = state.get("partners")
+    if partners is None or rebuild:
+        partners = OrderedDict((event_id, [kind, detector]) for event_id, kind, detector in progress.get("partners", []))
+    state["progress"] = progress
+    state["seen"] = seen
+    state["partners"] = partners
+
+    # A rebuild is written aside and swapped in, so readers never see a half-written file.
+    path = f"{OUT}.tmp" if rebuild else OUT
+    consumed = 0
+    merged = 0
+    with open(path, "wb" if rebuild else "ab") as f:
+        while True:
+            rules = read_new_records(RULE, progress["inputs"]["rule"], CHUNK_BYTES)
+            mls = read_new_records(ML, progress["inputs"]["ml"], CHUNK_BYTES)
+            if not rules and not mls:
+                break
+            consumed += len(rules) + len(mls)
+            for r in merge_batch(rules, mls, seen, partners):
+                f.write(dumps_line(r))
+                merged += 1
+    if rebuild:
+        os.replace(path, OUT)
+
+    if consumed or rebuild:
+        progress["seen"] = list(seen)
+        progress["partners"] = [[event_id, kind, detector] for event_id, (kind, detector) in partners.items()]
+        save_checkpoint(MERGE_STATE, progress)
+    print(f"merged alerts {merged}")
+    return {"alerts": merged, "dedup_window": len(seen), "pair_window": len(partners)}
+
+
 if __name__ == "__main__":
-    rows = read_jsonl(RULE) + read_jsonl(ML)
-    with open(OUT, "w", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r) + "\n")
-    print(f"merged alerts {len(rows)}")
+    run()
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+# jsonl_tail lives next to rule_engine.py, one directory up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import columnar_store
+from jsonl_tail import read_new_records
+
+EVENTS_GLOB = "/data/events/*.jsonl"
+FEATURES = ["is_fail", "proto_smb", "proto_rdp", "is_attack", "is_noise", "is_encoded"]
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+# Event columns the features are computed from, with the value a missing key stands for.
+FEATURE_COLUMNS = {"result": None, "proto": None, "event_type": None, "marker_encoding": "plain"}
+
+
+def encode_features(events: list) -> np.ndarray:
+    """Encode events into an ``(n, len(FEATURES))`` uint8 matrix, one column comparison at a time."""
+    return encode_columns(
+        {name: np.array([e.get(name, default) for e in events], dtype=object) for name, default in FEATURE_COLUMNS.items()}
+    )
+
+
+def encode_table(table) -> np.ndarray:
+    """``encode_features`` for a table scanned from the columnar store, without building dicts."""
+    return encode_columns({name: columnar_store.column(table, name, default) for name, default in FEATURE_COLUMNS.items()})
+
+
+def encode_columns(columns: dict) -> np.ndarray:
+    result = columns["result"]
+    proto = columns["proto"]
+    etype = columns["event_type"]
+    encoding = columns["marker_encoding"]
+
+    X = np.empty((len(result), len(FEATURES)), dtype=np.uint8)
+    X[:, 0] = result == "failure"
+    X[:, 1] = proto == "smb"
+    X[:, 2] = proto == "rdp"
+    X[:, 3] = etype == "attack_step"
+    X[:, 4] = etype == "noise"
+    X[:, 5] = encoding != "plain"
+    return X
+
+
+def iter_new_feature_chunks(files: dict, pattern: str = EVENTS_GLOB, chunk_bytes: int = CHUNK_BYTES):
+    """Yield ``(X, events)`` for events appended since the offsets in ``files``, which is updated in place."""
+    while True:
+        before = {p: e["offset"] for p, e in files.items()}
+        events = read_new_records(pattern, files, max_bytes=chunk_bytes)
+        if events:
+            yield encode_features(events), events
+        if {p: e["offset"] for p, e in files.items()} == before:
+            return
@@ -1,65 +1,97 @@
-﻿import glob
-import json
-import os
-import pandas as pd
+﻿import os
 import joblib
+import numpy as np
 
+from features import FEATURE_COLUMNS, encode_table, iter_new_feature_chunks
+import columnar_store
+from jsonio import dumps_line
+from jsonl_tail import load_checkpoint, save_checkpoint
 
-def load_rows():
-    rows = []
-    raw = []
-    for p in glob.glob("/data/events/*.jsonl"):
-        with open(p, "r", encoding="utf-8") as f:
-            for line in f:
-                e = json.loads(line)
-                raw.append(e)
-                rows.append(
-                    {
-                        "is_fail": 1 if e.get("result") == "failure" else 0,
-                        "proto_smb": 1 if e.get("proto") == "smb" else 0,
-                        "proto_rdp": 1 if e.get("proto") == "rdp" else 0,
-                        "is_attack": 1 if e.get("event_type") == "attack_step" else 0,
-                        "is_noise": 1 if e.get("event_type") == "noise" else 0,
-                        "is_encoded": 1 if e.get("marker_encoding", "plain") != "plain" else 0,
-                    }
-                )
-    return pd.DataFrame(rows).fillna(0), raw
+MODEL_PATH = "/data/models/iforest.joblib"
+MODEL_META = "/data/models/iforest.json"
+OUT_PATH = "/data/alerts/ml_alerts.jsonl"
+SCORE_STATE = "/data/state/score_checkpoint.json"
 
+# Columns a full re-score reads back from the columnar store: the features plus what an alert carries.
+SCAN_COLUMNS = sorted(set(FEATURE_COLUMNS) | {"id", "technique", "adversary_profile", "src_ip", "dst_ip", "username"})
 
-if __name__ == "__main__":
-    model_path = "/data/models/iforest.joblib"
-    out_path = "/data/alerts/ml_alerts.jsonl"
-    if not os.path.exists(model_path):
+
+def make_ml_alert(e: dict) -> dict:
+    return {
+        "detector": "ml_iforest",
+        "alert_type": "anomaly",
+        "detected": True,
+        "is_false_positive": False,
+        "technique": e.get("technique", "N/A"),
+        "source_event_id": e.get("id"),
+        "adversary_profile": e.get("adversary_profile"),
+        "marker_encoding": e.get("marker_encoding", "plain"),
+        "src_ip": e.get("src_ip"),
+        "dst_ip": e.get("dst_ip"),
+        "username": e.get("username"),
+    }
+
+
+def load_model(state: dict):
+    """Return the IsolationForest, reloading it only when the file on disk changes."""
+    mtime = os.stat(MODEL_PATH).st_mtime_ns
+    if state.get("model_mtime") != mtime:
+        state["model"] = joblib.load(MODEL_PATH)
+        state["model_mtime"] = mtime
+    return state["model"]
+
+
+def rescore_compacted(model, f) -> tuple[int, int, dict]:
+    """Score events already rolled into the columnar store; returns the JSONL offsets they cover."""
+    manifest = columnar_store.snapshot("events")
+    events = 0
+    alerts = 0
+    for table in columnar_store.scan("events", SCAN_COLUMNS, manifest=manifest):
+        events += table.num_rows
+        anomalies = np.flatnonzero(model.predict(encode_table(table)) == -1)
+        for e in columnar_store.rows(table.take(anomalies)):
+            alerts += 1
+            f.write(dumps_line(make_ml_alert(e)))
+    return events, alerts, manifest["files"]
+
+
+def run(state: dict | None = None) -> dict:
+    """Score events appended since the last pass; everything is re-scored when the model version changes."""
+    state = {} if state is None else state
+    if not os.path.exists(MODEL_PATH):
         print("Model not found; skipping score")
-    else:
-        model = joblib.load(model_path)
-        X, raw = load_rows()
-        if X.empty:
-            print("No events to score")
-        else:
+        return {"anomalies": 0}
+    model = load_model(state)
+    version = load_checkpoint(MODEL_META).get("version", 0)
+    progress = state.get("progress") or load_checkpoint(SCORE_STATE)
+    rescore = not progress or progress.get("model_version") != version or not os.path.exists(OUT_PATH)
+    if rescore:
+        progress = {"files": {}, "model_version": version}
+    state["progress"] = progress
+
+    # A full re-score is written aside and swapped in, so readers never see a half-written file.
+    path = f"{OUT_PATH}.tmp" if rescore else OUT_PATH
+    events = 0
+    alerts = 0
+    with open(path, "wb" if rescore else "ab") as f:
+        if rescore and columnar_store.available():
+            # Only the JSONL written after the last compaction is parsed as text.
+            events, alerts, progress["files"] = rescore_compacted(model, f)
+        for X, raw in iter_new_feature_chunks(progress["files"]):
+            events += len(raw)
             preds = model.predict(X)
-            alerts = 0
-            with open(out_path, "w", encoding="utf-8") as f:
-                for e, p in zip(raw, preds):
-                    if p != -1:
-                        continue
-                    alerts += 1
-                    f.write(
-                        json.dumps(
-                            {
-                                "detector": "ml_iforest",
-                                "alert_type": "anomaly",
-                                "detected": True,
-                                "is_false_positive": False,
-                                "technique": e.get("technique", "N/A"),
-                                "source_event_id": e.get("id"),
-                                "adversary_profile": e.get("adversary_profile"),
-                                "marker_encoding": e.get("marker_encoding", "plain"),
-                                "src_ip": e.get("src_ip"),
-                                "dst_ip": e.get("dst_ip"),
-                                "username": e.get("username"),
-                            }
-                        )
-                        + "\n"
-                    )
-            print(f"ml anomalies {alerts}")
+            for e, p in zip(raw, preds):
+                if p != -1:
+                    continue
+                alerts += 1
+                f.write(dumps_line(make_ml_alert(e)))
+    if rescore:
+        os.replace(path, OUT_PATH)
+    if events or rescore:
+        save_checkpoint(SCORE_STATE, progress)
+    print(f"ml anomalies {alerts} scored={events} model_version={version} rescore={rescore}")
+    return {"events": events, "anomalies": alerts, "model_version": version, "rescore": rescore}
+
+
+if __name__ == "__main__":
+    run()
@@ -1,36 +1,117 @@
-﻿import glob
-import json
-import pandas as pd
+﻿import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
 from sklearn.ensemble import IsolationForest
 import joblib
 
+from features import FEATURES, iter_new_feature_chunks
+from jsonl_tail import load_checkpoint, save_checkpoint
+
+MODEL_PATH = "/data/models/iforest.joblib"
+MODEL_META = "/data/models/iforest.json"
+RESERVOIR_PATH = "/data/models/train_reservoir.npy"
+TRAIN_STATE = "/data/state/train_checkpoint.json"
+
+# The model is always fit on at most RESERVOIR_SIZE rows, a uniform sample of
+# every event seen so far, so a refit costs the same however large the store grows.
+RESERVOIR_SIZE = int(os.getenv("TRAIN_RESERVOIR_SIZE", "20000"))
+# Once the reservoir is full, refit only after this fraction of its rows has been
+# replaced since the last fit. Every new version makes score.py re-score the whole
+# history, and a sample that barely moved gives the same forest; under Algorithm R
+# the replacement rate falls as history grows, so refits (and re-scores) thin out.
+MIN_TURNOVER = float(os.getenv("TRAIN_MIN_TURNOVER", "0.05"))
+
+
+def update_reservoir(reservoir: np.ndarray, X: np.ndarray, seen: int) -> tuple[np.ndarray, int]:
+    """Fold ``X`` into a uniform reservoir sample (Algorithm R) of everything seen so far.
+
+    Returns the reservoir and how many of its full-reservoir slots were overwritten.
+    """
+    free = max(0, RESERVOIR_SIZE - len(reservoir))
+    if free:
+        reservoir = np.concatenate([reservoir, X[:free]])
+        seen += min(free, len(X))
+        X = X[free:]
+    replaced = 0
+    if len(X):
+        rng = np.random.default_rng(seen)
+        slots = rng.integers(0, seen + np.arange(1, len(X) + 1))
+        keep = slots < RESERVOIR_SIZE
+        reservoir[slots[keep]] = X[keep]
+        replaced = len(np.unique(slots[keep]))
+    return reservoir, replaced
+
+
+def load_reservoir() -> np.ndarray:
+    if os.path.exists(RESERVOIR_PATH):
+        return np.load(RESERVOIR_PATH)
+    return np.empty((0, len(FEATURES)), dtype=np.uint8)
+
+
+def save_atomic(path: str, write) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def should_retrain(progress: dict, reservoir: np.ndarray) -> bool:
+    if not os.path.exists(MODEL_PATH):
+        return len(reservoir) > 0
+    if not progress["pending"]:
+        return False
+    return len(reservoir) < RESERVOIR_SIZE or progress["replaced"] >= MIN_TURNOVER * RESERVOIR_SIZE
+
+
+def run(state: dict | None = None) -> dict:
+    state = {} if state is None else state
+    progress = state.get("progress") or load_checkpoint(TRAIN_STATE)
+    if not progress:
+        progress = {"files": {}, "seen": 0, "pending": 0, "replaced": 0, "version": 0}
+    progress.setdefault("replaced", 0)
+    reservoir = state.get("reservoir")
+    if reservoir is None:
+        reservoir = load_reservoir()
+
+    new_rows = 0
+    for X, _ in iter_new_feature_chunks(progress["files"]):
+        reservoir, replaced = update_reservoir(reservoir, X, progress["seen"])
+        progress["seen"] += len(X)
+        progress["replaced"] += replaced
+        progress["pending"] += len(X)
+        new_rows += len(X)
+    state["progress"] = progress
+    state["reservoir"] = reservoir
+
+    if not should_retrain(progress, reservoir):
+        if new_rows:
+            save_atomic(RESERVOIR_PATH, lambda f: np.save(f, reservoir))
+            save_checkpoint(TRAIN_STATE, progress)
+        print(f"training skipped new={new_rows} pending={progress['pending']} replaced={progress['replaced']}")
+        return {"rows": 0, "new": new_rows, "pending": progress["pending"], "version": progress["version"]}
 
-def load_rows():
-    rows = []
-    for p in glob.glob("/data/events/*.jsonl"):
-        with open(p, "r", encoding="utf-8") as f:
-            for line in f:
-                e = json.loads(line)
-                rows.append(
-                    {
-                        "is_fail": 1 if e.get("result") == "failure" else 0,
-                        "proto_smb": 1 if e.get("proto") == "smb" else 0,
-                        "proto_rdp": 1 if e.get("proto") == "rdp" else 0,
-                        "is_attack": 1 if e.get("event_type") == "attack_step" else 0,
-                        "is_noise": 1 if e.get("event_type") == "noise" else 0,
-                        "is_encoded": 1 if e.get("marker_encoding", "plain") != "plain" else 0,
-                    }
-                )
-    return pd.DataFrame(rows).fillna(0)
+    model = IsolationForest(contamination=0.12, random_state=42)
+    model.fit(reservoir)
+    version = progress["version"] + 1
+    save_atomic(MODEL_PATH, lambda f: joblib.dump(model, f))
+    meta = {
+        "version": version,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "rows": len(reservoir),
+        "seen": progress["seen"],
+    }
+    save_atomic(MODEL_META, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    progress["version"] = version
+    progress["pending"] = 0
+    progress["replaced"] = 0
+    save_atomic(RESERVOIR_PATH, lambda f: np.save(f, reservoir))
+    save_checkpoint(TRAIN_STATE, progress)
+    print(f"trained {len(reservoir)} rows version={version} seen={progress['seen']}")
+    return {"rows": len(reservoir), "new": new_rows, "pending": 0, "version": version}
 
 
 if __name__ == "__main__":
-    df = load_rows()
-    if df.empty:
-        print("No events yet; skipping training")
-    else:
-        X = df[["is_fail", "proto_smb", "proto_rdp", "is_attack", "is_noise", "is_encoded"]]
-        model = IsolationForest(contamination=0.12, random_state=42)
-        model.fit(X)
-        joblib.dump(model, "/data/models/iforest.joblib")
-        print(f"trained {len(df)} rows")
+    run()
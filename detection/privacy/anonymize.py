@@ -1,35 +1,56 @@
 ﻿import json
-import hashlib
 import os
+import sys
 from diffprivlib.mechanisms import Laplace
 
+from pseudonymize import pseudonymizer
+
+# jsonio lives next to rule_engine.py, one directory up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonio import dumps_line, loads
+
 INP = "/data/alerts/combined_alerts.jsonl"
 OUT = "/data/alerts/ml_alerts_private.jsonl"
+OUT_METRICS = "/data/alerts/private_metrics.json"
+BATCH_SIZE = 1000
 
 
-def h(value: str) -> str:
-    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+def write_batch(fo, batch: list) -> None:
+    for e in pseudonymizer.anonymize_records(batch):
+        fo.write(dumps_line(e))
 
 
-if __name__ == "__main__":
-    mech = Laplace(epsilon=1.0, sensitivity=1.0)
+def run(state: dict | None = None) -> dict:
+    state = {} if state is None else state
+    mech = state.get("mech")
+    if mech is None:
+        mech = state["mech"] = Laplace(epsilon=1.0, sensitivity=1.0)
     count = 0
     if not os.path.exists(INP):
         print("No alerts yet; skipping anonymization")
-    else:
-        with open(INP, "r", encoding="utf-8") as fi, open(OUT, "w", encoding="utf-8") as fo:
-            for line in fi:
-                e = json.loads(line)
-                if e.get("src_ip"):
-                    e["src_ip"] = h(str(e["src_ip"]))
-                if e.get("dst_ip"):
-                    e["dst_ip"] = h(str(e["dst_ip"]))
-                if e.get("username"):
-                    e["username"] = h(str(e["username"]))
-                count += 1
-                fo.write(json.dumps(e) + "\n")
-
-        noisy = mech.randomise(count)
-        with open("/data/alerts/private_metrics.json", "w", encoding="utf-8") as f:
-            json.dump({"alerts_count_dp": noisy}, f)
-        print(f"anonymized {count} alerts")
+        return {"alerts": 0}
+    with open(INP, "rb") as fi, open(OUT, "wb") as fo:
+        batch = []
+        for line in fi:
+            try:
+                batch.append(loads(line))
+            except json.JSONDecodeError:
+                continue
+            if len(batch) >= BATCH_SIZE:
+                write_batch(fo, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            write_batch(fo, batch)
+            count += len(batch)
+
+    noisy = mech.randomise(count)
+    with open(OUT_METRICS, "w", encoding="utf-8") as f:
+        json.dump({"alerts_count_dp": noisy}, f)
+    cache = pseudonymizer.stats()
+    print(f"anonymized {count} alerts cache_hit_rate={cache['hit_rate']}")
+    return {"alerts": count, "pseudonym_cache": cache}
+
+
+if __name__ == "__main__":
+    run()
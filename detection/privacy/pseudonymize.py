@@ -0,0 +1,55 @@
+import hashlib
+import hmac
+import os
+from functools import lru_cache
+
+PII_KEYS = ("src_ip", "dst_ip", "username")
+
+
+class Pseudonymizer:
+    """Keyed-hash pseudonyms with a bounded LRU cache.
+
+    With a salt, tokens are HMAC-SHA256 so labs configured with different secrets
+    produce unlinkable pseudonyms; without one they are plain SHA-256 prefixes.
+    The backend's security_utils.Pseudonymizer implements the same scheme.
+    """
+
+    def __init__(self, salt: str = "", length: int = 12, cache_size: int = 4096):
+        self.key = salt.encode("utf-8")
+        self.length = length
+        self._token = lru_cache(maxsize=cache_size)(self._digest)
+
+    def _digest(self, value: str) -> str:
+        raw = value.encode("utf-8")
+        if self.key:
+            return hmac.new(self.key, raw, hashlib.sha256).hexdigest()[: self.length]
+        return hashlib.sha256(raw).hexdigest()[: self.length]
+
+    def token(self, value: str) -> str:
+        return self._token(value)
+
+    def anonymize_records(self, records: list, keys=PII_KEYS) -> list:
+        """Pseudonymize ``records`` in place, hashing each distinct value once per batch."""
+        table = {str(r[k]): None for r in records for k in keys if r.get(k)}
+        for value in table:
+            table[value] = self.token(value)
+        for r in records:
+            for k in keys:
+                if r.get(k):
+                    r[k] = table[str(r[k])]
+        return records
+
+    def stats(self) -> dict:
+        info = self._token.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+            "keyed": bool(self.key),
+        }
+
+
+pseudonymizer = Pseudonymizer(os.getenv("PSEUDONYM_SALT", ""))
@@ -1,14 +1,45 @@
 ﻿import base64
-import glob
 import json
 import os
+import sys
+import time
+import traceback
 from datetime import datetime, timezone
 
+import columnar_store
+from jsonio import dumps_line
+from jsonl_tail import load_checkpoint, read_new_records, save_checkpoint
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # not Linux, or the optional dependency is missing: poll instead
+    INotify = None
+
 MODE_FILE = "/data/config/detection_mode.json"
+EVENTS_DIR = "/data/events"
+EVENTS_GLOB = "/data/events/*.jsonl"
 OUT_ALERTS = "/data/alerts/rule_alerts.jsonl"
 OUT_COVERAGE = "/data/alerts/coverage.json"
+# File offsets and coverage counters share one document, so one atomic write commits both.
+CHECKPOINT = "/data/state/rule_engine_checkpoint.json"
+
+# Streaming mode: how long to sleep between polls when inotify is unavailable,
+# and how long an inotify wait may block before re-checking the stop flag.
+POLL_INTERVAL = 0.05
+WATCH_TIMEOUT_MS = 1000
 
 KNOWN_TECHNIQUES = ["T1078", "T1003", "T1021"]
+# Event columns make_rule_alert and count_coverage read; a rebuild scans only these.
+RULE_COLUMNS = [
+    "id",
+    "event_type",
+    "technique",
+    "attack_id",
+    "adversary_profile",
+    "marker",
+    "marker_encoding",
+    "false_positive_candidate",
+]
 
 
 def now_ts() -> str:
@@ -23,18 +54,6 @@ def get_mode() -> str:
     return data.get("mode", "legacy")
 
 
-def read_events():
-    events = []
-    for p in glob.glob("/data/events/*.jsonl"):
-        with open(p, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    events.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-    return events
-
-
 def decode_marker(marker: str, encoding: str) -> str:
     if not marker:
         return ""
@@ -112,9 +131,18 @@ def make_rule_alert(event: dict, mode: str):
     }
 
 
-def build_coverage(events: list, alerts: list, mode: str):
-    executed = {t: 0 for t in KNOWN_TECHNIQUES}
-    detected = {t: 0 for t in KNOWN_TECHNIQUES}
+def new_counters() -> dict:
+    return {
+        "executed": {t: 0 for t in KNOWN_TECHNIQUES},
+        "detected": {t: 0 for t in KNOWN_TECHNIQUES},
+        "false_positives": 0,
+    }
+
+
+def count_coverage(counts: dict, events: list, alerts: list) -> None:
+    """Fold a batch of events and the alerts they produced into running ``counts``."""
+    executed = counts["executed"]
+    detected = counts["detected"]
 
     for e in events:
         t = e.get("technique")
@@ -125,6 +153,13 @@ def build_coverage(events: list, alerts: list, mode: str):
         t = a.get("technique")
         if a.get("detected") and t in detected:
             detected[t] += 1
+        if a.get("is_false_positive"):
+            counts["false_positives"] += 1
+
+
+def build_coverage(counts: dict, mode: str):
+    executed = counts["executed"]
+    detected = counts["detected"]
 
     summary = []
     gaps = []
@@ -154,29 +189,142 @@ def build_coverage(events: list, alerts: list, mode: str):
         "totals": {
             "executed": all_executed,
             "detected": all_detected,
-            "false_positives": sum(1 for a in alerts if a.get("is_false_positive")),
+            "false_positives": counts["false_positives"],
         },
         "summary": summary,
         "gaps": gaps,
     }
 
 
-if __name__ == "__main__":
+def rebuild_from_store(f, counters: dict, mode: str) -> tuple[int, int, dict]:
+    """Re-evaluate events already rolled into the columnar store; returns the JSONL offsets they cover."""
+    manifest = columnar_store.snapshot("events")
+    events = 0
+    alerts = 0
+    for table in columnar_store.scan("events", RULE_COLUMNS, manifest=manifest):
+        batch = columnar_store.rows(table)
+        raised = [a for a in (make_rule_alert(e, mode) for e in batch) if a is not None]
+        for alert in raised:
+            f.write(dumps_line(alert))
+        count_coverage(counters, batch, raised)
+        events += len(batch)
+        alerts += len(raised)
+    return events, alerts, manifest["files"]
+
+
+def process_new_events(state: dict) -> dict:
+    """Evaluate events appended since the last call; ``state`` keeps the parsed checkpoint resident."""
     os.makedirs("/data/alerts", exist_ok=True)
     mode = get_mode()
-    events = read_events()
+    checkpoint = state.get("checkpoint") or load_checkpoint(CHECKPOINT)
+    rebuild = "modes" not in checkpoint or not os.path.exists(OUT_ALERTS)
+    if rebuild:
+        # First run, or /lab/reset removed the alert history: start over from byte zero.
+        checkpoint = {"files": {}, "modes": {}}
+    state["checkpoint"] = checkpoint
+    # Counters are kept per detection mode so legacy and hardened runs never mix.
+    counters = checkpoint["modes"].setdefault(mode, new_counters())
+    truncate = rebuild
+    replayed = replayed_alerts = 0
+    if rebuild and columnar_store.available():
+        # Compacted history comes back column-pruned from Parquet; only the newer JSONL tail is parsed.
+        with open(OUT_ALERTS, "wb") as f:
+            replayed, replayed_alerts, checkpoint["files"] = rebuild_from_store(f, counters, mode)
+        truncate = False
+    events = read_new_records(EVENTS_GLOB, checkpoint["files"])
     alerts = []
 
-    with open(OUT_ALERTS, "w", encoding="utf-8") as f:
-        for e in events:
-            alert = make_rule_alert(e, mode)
-            if alert is None:
-                continue
-            alerts.append(alert)
-            f.write(json.dumps(alert) + "\n")
+    if events or rebuild:
+        with open(OUT_ALERTS, "wb" if truncate else "ab") as f:
+            for e in events:
+                alert = make_rule_alert(e, mode)
+                if alert is None:
+                    continue
+                alerts.append(alert)
+                f.write(dumps_line(alert))
 
-    coverage = build_coverage(events, alerts, mode)
-    with open(OUT_COVERAGE, "w", encoding="utf-8") as f:
-        json.dump(coverage, f)
+    if events or rebuild or mode != state.get("mode"):
+        count_coverage(counters, events, alerts)
+        coverage = build_coverage(counters, mode)
+        with open(OUT_COVERAGE, "w", encoding="utf-8") as f:
+            json.dump(coverage, f)
+        save_checkpoint(CHECKPOINT, checkpoint)
+    state["mode"] = mode
 
-    print(f"rule_engine mode={mode} alerts={len(alerts)}")
+    return {
+        "mode": mode,
+        "events": len(events) + replayed,
+        "alerts": len(alerts) + replayed_alerts,
+        "last_event_ts": events[-1].get("ts") if events else None,
+    }
+
+
+def run(state: dict | None = None) -> dict:
+    """Run one batch rule-engine pass."""
+    result = process_new_events({} if state is None else state)
+    print(f"rule_engine mode={result['mode']} events={result['events']} alerts={result['alerts']}")
+    return result
+
+
+def event_lag_ms(ts: str | None) -> float | None:
+    if not ts:
+        return None
+    try:
+        return round((datetime.now(timezone.utc) - datetime.fromisoformat(ts)).total_seconds() * 1000, 2)
+    except (TypeError, ValueError):
+        return None
+
+
+def follow(state: dict | None = None, stop_event=None) -> None:
+    """Stream new events into rule alerts as soon as they are appended.
+
+    Waits on inotify for changes in ``EVENTS_DIR`` when available and falls back to
+    polling every ``POLL_INTERVAL`` seconds otherwise. Throughput and the lag between
+    an event's ``ts`` and its evaluation are kept in ``state["stream"]``.
+    """
+    state = {} if state is None else state
+    stats = state.setdefault(
+        "stream",
+        {
+            "watcher": "inotify" if INotify else "poll",
+            "batches": 0,
+            "events": 0,
+            "alerts": 0,
+            "last_lag_ms": None,
+            "max_lag_ms": None,
+        },
+    )
+    os.makedirs(EVENTS_DIR, exist_ok=True)
+    watcher = None
+    if INotify is not None:
+        watcher = INotify()
+        watcher.add_watch(EVENTS_DIR, flags.MODIFY | flags.CREATE | flags.MOVED_TO | flags.DELETE)
+
+    while stop_event is None or not stop_event.is_set():
+        try:
+            result = process_new_events(state)
+        except Exception:
+            traceback.print_exc()
+            state.pop("checkpoint", None)
+            time.sleep(1.0)
+            continue
+        if result["events"]:
+            stats["batches"] += 1
+            stats["events"] += result["events"]
+            stats["alerts"] += result["alerts"]
+            lag = event_lag_ms(result["last_event_ts"])
+            if lag is not None:
+                stats["last_lag_ms"] = lag
+                stats["max_lag_ms"] = max(lag, stats["max_lag_ms"] or 0.0)
+            continue
+        if watcher is not None:
+            watcher.read(timeout=WATCH_TIMEOUT_MS)
+        else:
+            time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    if "--follow" in sys.argv[1:]:
+        follow()
+    else:
+        run()
@@ -0,0 +1,196 @@
+import gzip
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_tail import follow_renames, read_new_records
+
+SEGMENT = "events.20261017T100000Z-000001.jsonl"
+
+
+def write(path, n, start=0):
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(start, start + n):
+            f.write(f'{{"id": {i}, "ts": "2026-10-17T10:00:{i % 60:02d}+00:00"}}\n')
+
+
+def compress(path):
+    """What segments.compress does: write the archive, then unlink the plain segment."""
+    with open(path, "rb") as src, gzip.open(str(path) + ".gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.unlink(path)
+    return str(path) + ".gz"
+
+
+def ids(records):
+    return [r["id"] for r in records]
+
+
+def test_rotation_carries_offset_onto_segment(tmp_path):
+    active = tmp_path / "events.jsonl"
+    pattern = str(tmp_path / "*.jsonl")
+    files = {}
+    write(active, 5)
+    assert ids(read_new_records(pattern, files)) == [0, 1, 2, 3, 4]
+
+    write(active, 3, start=5)
+    os.rename(active, tmp_path / SEGMENT)
+    active.touch()
+    write(active, 2, start=8)
+    assert sorted(ids(read_new_records(pattern, files))) == [5, 6, 7, 8, 9]
+
+
+def test_rotation_waits_for_active_file_to_reappear(tmp_path):
+    active = tmp_path / "events.jsonl"
+    pattern = str(tmp_path / "*.jsonl")
+    files = {}
+    write(active, 5)
+    read_new_records(pattern, files)
+
+    os.rename(active, tmp_path / SEGMENT)
+    assert read_new_records(pattern, files) == []
+    assert str(active) in files
+
+    active.touch()
+    assert read_new_records(pattern, files) == []
+    assert files[str(tmp_path / SEGMENT)]["offset"] > 0
+
+
+def test_compressed_segment_is_read_from_its_offset(tmp_path):
+    segment = tmp_path / SEGMENT
+    write(segment, 5)
+    pattern = str(tmp_path / "*.jsonl")
+    files = {}
+    assert ids(read_new_records(pattern, files, max_bytes=100)) == [0, 1]
+
+    archive = compress(segment)
+    assert ids(read_new_records(pattern, files, max_bytes=100)) == [2, 3]
+    assert str(segment) not in files
+    assert ids(read_new_records(pattern, files, max_bytes=100)) == [4]
+    assert files[archive]["eof"]
+    assert read_new_records(pattern, files) == []
+
+
+def test_archive_is_held_until_the_plain_segment_is_unlinked(tmp_path):
+    segment = tmp_path / SEGMENT
+    write(segment, 3)
+    with open(segment, "rb") as src, gzip.open(str(segment) + ".gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    pattern = str(tmp_path / "*.jsonl")
+    files = {}
+    assert ids(read_new_records(pattern, files)) == [0, 1, 2]
+    assert list(files) == [str(segment)]
+
+    os.unlink(segment)
+    assert read_new_records(pattern, files) == []
+    assert list(files) == [str(segment) + ".gz"]
+
+
+def test_reused_inode_of_compressed_segment_is_not_followed(tmp_path):
+    segment = tmp_path / SEGMENT
+    write(segment, 20)
+    offset = segment.stat().st_size
+    # Compression writes segment.gz and unlinks the plain file; a new active file
+    # may then get the freed inode.
+    compress(segment)
+    active = tmp_path / "events.jsonl"
+    write(active, 2)
+    # The kernel may or may not hand out the freed inode again; pin the reuse for the test.
+    files = {str(segment): {"inode": active.stat().st_ino, "offset": offset, "carry": ""}}
+
+    moved, held = follow_renames(files, [str(active), str(segment) + ".gz"])
+    assert moved == {str(segment): str(segment) + ".gz"} and held == {}
+    assert files[str(segment) + ".gz"]["offset"] == offset
+    assert ids(read_new_records(str(tmp_path / "*.jsonl"), files)) == [0, 1]
+
+
+def test_reused_inode_needs_an_active_to_segment_rename(tmp_path):
+    expired = tmp_path / "events.20261017T090000Z-000001.jsonl"
+    segment = tmp_path / "events.20261017T100000Z-000002.jsonl"
+    write(segment, 2)
+    # Retention deleted ``expired``; a later seal produced ``segment`` on its inode.
+    files = {str(expired): {"inode": segment.stat().st_ino, "offset": 0, "carry": ""}}
+    assert follow_renames(files, [str(segment)]) == ({}, {})
+
+
+def test_rename_checks_size_and_never_overwrites(tmp_path):
+    active = tmp_path / "events.jsonl"
+    segment = tmp_path / SEGMENT
+    write(segment, 2)
+    active.touch()
+    inode = segment.stat().st_ino
+    files = {str(active): {"inode": inode, "offset": 10_000, "carry": ""}}
+    assert follow_renames(files, [str(active), str(segment)]) == ({}, {})
+
+    files = {
+        str(active): {"inode": inode, "offset": 0, "carry": ""},
+        str(segment): {"inode": -1, "offset": 5, "carry": ""},
+    }
+    assert follow_renames(files, [str(active), str(segment)]) == ({}, {})
+    assert files[str(segment)]["offset"] == 5
+
+
+def test_compaction_keeps_parts_off_a_reused_inode(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import columnar_store
+
+    monkeypatch.setattr(columnar_store, "STORE_DIR", str(tmp_path / "columnar"))
+    monkeypatch.setattr(columnar_store, "DATASETS", {"events": (str(tmp_path / "*.jsonl"), columnar_store.EVENT_COLUMNS)})
+    active = tmp_path / "events.jsonl"
+    write(active, 10)
+    columnar_store.compact(force=True)
+
+    segment = tmp_path / SEGMENT
+    os.rename(active, segment)
+    active.touch()
+    columnar_store.compact(force=True)
+    archive = compress(segment)
+    write(active, 3, start=100)
+
+    # The new active file lands on the compressed segment's freed inode before compaction sees either.
+    manifest = columnar_store.load_manifest("events")
+    manifest["files"][str(segment)]["inode"] = active.stat().st_ino
+    columnar_store.save_checkpoint(columnar_store.manifest_path("events"), manifest)
+
+    columnar_store.compact(force=True)
+    snap = columnar_store.snapshot("events")
+    rows = [r["id"] for t in columnar_store.scan("events", manifest=snap) for r in columnar_store.rows(t)]
+    assert sorted(rows) == [*range(10), 100, 101, 102]
+    assert snap["files"][str(active)]["offset"] == active.stat().st_size
+    assert snap["files"][archive]["eof"]
+    assert all(part["source"] in (archive, str(active)) for part in snap["parts"])
+
+
+def test_file_recreated_on_the_same_inode_restarts(tmp_path):
+    active = tmp_path / "events.jsonl"
+    pattern = str(tmp_path / "*.jsonl")
+    files = {}
+    write(active, 3)
+    assert ids(read_new_records(pattern, files)) == [0, 1, 2]
+
+    # /lab/reset: the file is emptied and refilled past the old offset on the same inode.
+    active.write_bytes(b"")
+    write(active, 5, start=50)
+    assert ids(read_new_records(pattern, files)) == [50, 51, 52, 53, 54]
+
+
+def test_snapshot_drops_parts_of_a_recreated_file(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import columnar_store
+
+    monkeypatch.setattr(columnar_store, "STORE_DIR", str(tmp_path / "columnar"))
+    monkeypatch.setattr(columnar_store, "DATASETS", {"events": (str(tmp_path / "*.jsonl"), columnar_store.EVENT_COLUMNS)})
+    active = tmp_path / "events.jsonl"
+    write(active, 10)
+    columnar_store.compact(force=True)
+
+    active.write_bytes(b"")
+    write(active, 12, start=50)
+    snap = columnar_store.snapshot("events")
+    assert snap["parts"] == [] and snap["files"] == {}
+    columnar_store.compact(force=True)
+    rows = [r["id"] for t in columnar_store.scan("events") for r in columnar_store.rows(t)]
+    assert sorted(rows) == list(range(50, 62))
@@ -1,8 +1,10 @@
 ﻿import argparse
 import base64
+import glob
 import json
 import os
 import random
+import re
 import time
 import uuid
 from datetime import datetime, timezone
@@ -11,6 +13,9 @@ from profiles import choose_profile, maybe
 
 EVENT_OUT = "/data/events/attack_chain_events.jsonl"
 NOISE_OUT = "/data/events/noise_events.jsonl"
+# Output files past this size are sealed before the next chain appends, using the
+# backend's segment naming so its manifest, compression and retention cover them.
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
 
 CHAIN_TEMPLATE = [
     ("T1078", "initial_access_via_valid_accounts_sim"),
@@ -36,9 +41,21 @@ def encode_marker(marker: str, method: str) -> str:
     return marker
 
 
-def write_jsonl(path: str, event: dict):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event) + "\n")
+def seal_if_full(path: str):
+    if not SEGMENT_MAX_BYTES or not os.path.exists(path) or os.path.getsize(path) < SEGMENT_MAX_BYTES:
+        return
+    stem = path[: -len(".jsonl")]
+    seqs = [re.search(r"-(\d{6})\.jsonl", p) for p in glob.glob(f"{stem}.*-*.jsonl*")]
+    seq = 1 + max((int(m.group(1)) for m in seqs if m), default=0)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    os.rename(path, f"{stem}.{stamp}-{seq:06d}.jsonl")
+    open(path, "a", encoding="utf-8").close()
+
+
+def write_jsonl(f, event: dict):
+    # Output files are opened once per chain, line-buffered, so every event still
+    # reaches the detector as one whole line.
+    f.write(json.dumps(event) + "\n")
 
 
 def emit_chain(profile_name: str, include_noise: bool, force_evasion: bool):
@@ -47,35 +64,40 @@ def emit_chain(profile_name: str, include_noise: bool, force_evasion: bool):
     total_steps = cfg["chain_repeats"] * len(CHAIN_TEMPLATE)
     step_number = 0
 
-    for _ in range(cfg["chain_repeats"]):
-        for technique, action in CHAIN_TEMPLATE:
-            step_number += 1
-            use_evasion = force_evasion or maybe(cfg["evasion_rate"])
-            marker = f"SHADOWHUNT_{technique}_SIM"
-            encoding = random.choice(["base64", "xor"]) if use_evasion else "plain"
-            marker_payload = encode_marker(marker, encoding)
-
-            event = {
-                "id": str(uuid.uuid4()),
-                "ts": ts(),
-                "event_type": "attack_step",
-                "attack_id": attack_id,
-                "step_number": step_number,
-                "total_steps": total_steps,
-                "technique": technique,
-                "action": action,
-                "adversary_profile": profile_name,
-                "src_ip": random.choice(["10.10.0.11", "10.10.0.12", "10.10.0.13"]),
-                "dst_ip": random.choice(["10.10.0.31", "10.10.0.32", "10.10.0.33"]),
-                "result": "success",
-                "marker": marker_payload,
-                "marker_encoding": encoding,
-                "note": "synthetic-chain-event-only",
-            }
-            write_jsonl(EVENT_OUT, event)
-            time.sleep(cfg["step_delay"])
-
-    if include_noise:
+    seal_if_full(EVENT_OUT)
+    with open(EVENT_OUT, "a", encoding="utf-8", buffering=1) as out:
+        for _ in range(cfg["chain_repeats"]):
+            for technique, action in CHAIN_TEMPLATE:
+                step_number += 1
+                use_evasion = force_evasion or maybe(cfg["evasion_rate"])
+                marker = f"SHADOWHUNT_{technique}_SIM"
+                encoding = random.choice(["base64", "xor"]) if use_evasion else "plain"
+                marker_payload = encode_marker(marker, encoding)
+
+                event = {
+                    "id": str(uuid.uuid4()),
+                    "ts": ts(),
+                    "event_type": "attack_step",
+                    "attack_id": attack_id,
+                    "step_number": step_number,
+                    "total_steps": total_steps,
+                    "technique": technique,
+                    "action": action,
+                    "adversary_profile": profile_name,
+                    "src_ip": random.choice(["10.10.0.11", "10.10.0.12", "10.10.0.13"]),
+                    "dst_ip": random.choice(["10.10.0.31", "10.10.0.32", "10.10.0.33"]),
+                    "result": "success",
+                    "marker": marker_payload,
+                    "marker_encoding": encoding,
+                    "note": "synthetic-chain-event-only",
+                }
+                write_jsonl(out, event)
+                time.sleep(cfg["step_delay"])
+
+    if not include_noise:
+        return
+    seal_if_full(NOISE_OUT)
+    with open(NOISE_OUT, "a", encoding="utf-8", buffering=1) as out:
         for _ in range(cfg["noise_events"]):
             n = {
                 "id": str(uuid.uuid4()),
@@ -97,7 +119,7 @@ def emit_chain(profile_name: str, include_noise: bool, force_evasion: bool):
                 "result": "benign",
                 "note": "synthetic-noise-event",
             }
-            write_jsonl(NOISE_OUT, n)
+            write_jsonl(out, n)
 
 
 if __name__ == "__main__":
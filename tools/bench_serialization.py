@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Compare the event/alert write path under stdlib json and orjson.
+
+"legacy" serializes the way the backend used to: json.dumps once for the event file,
+once per alert for the alert file, and again for the telemetry message. "encode-once"
+uses app.serialization: each record is serialized to bytes a single time and the
+telemetry message is spliced together from those bytes.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app import serialization  # noqa: E402
+
+
+def sample_event(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "event_type": "attack_step",
+        "technique": "T1021",
+        "attack_id": str(uuid.uuid4()),
+        "step_number": i,
+        "total_steps": 60,
+        "src_ip": "10.0.21.11",
+        "dst_ip": "10.0.22.31",
+        "host": "victim-ubuntu-1",
+        "target_host": "ad-mock",
+        "containerized_victim": True,
+        "ad_simulated": True,
+        "network_namespace": "shadow_net",
+        "result": "success",
+        "action": "impacket_wmiexec",
+        "proto": "smb",
+        "mitre": "T1021",
+    }
+
+
+def sample_alerts(event: dict) -> list:
+    return [
+        {
+            "ts": event["ts"],
+            "detector": detector,
+            "severity": "high",
+            "alert_type": "rule_match",
+            "technique": event["technique"],
+            "detected": True,
+            "is_false_positive": False,
+            "reason": "signature_match",
+        }
+        for detector in ("suricata_snort_sim", "ml_isolation_forest_sim")
+    ]
+
+
+def legacy(events: list) -> int:
+    size = 0
+    for event, alerts in events:
+        size += len(json.dumps(event) + "\n")
+        for a in alerts:
+            size += len(json.dumps(a) + "\n")
+        size += len(json.dumps({"kind": "event", "event": event, "alerts": alerts, "seq": 1}))
+    return size
+
+
+def encode_once(events: list) -> int:
+    size = 0
+    for event, alerts in events:
+        event_line = serialization.dumps_line(event)
+        alert_lines = [serialization.dumps_line(a) for a in alerts]
+        msg = serialization.dumps_object(
+            {
+                "kind": "event",
+                "event": serialization.Encoded(event_line[:-1]),
+                "alerts": serialization.encoded_array([serialization.Encoded(line[:-1]) for line in alert_lines]),
+                "seq": 1,
+            }
+        )
+        size += len(event_line) + sum(map(len, alert_lines)) + len(msg)
+    return size
+
+
+def parse(lines: list) -> int:
+    return sum(len(serialization.loads(line)) for line in lines)
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50_000)
+    args = parser.parse_args()
+
+    events = [(e, sample_alerts(e)) for e in (sample_event(i) for i in range(args.events))]
+    lines = [serialization.dumps_line(e) for e, _ in events]
+
+    results = {"legacy_json": timed(legacy, events)}
+    results[f"encode_once_{serialization.BACKEND}"] = timed(encode_once, events)
+    results[f"parse_{serialization.BACKEND}"] = timed(parse, lines)
+    if serialization.orjson is not None:
+        orjson = serialization.orjson
+        serialization.orjson = None
+        results["encode_once_json"] = timed(encode_once, events)
+        results["parse_json"] = timed(parse, lines)
+        serialization.orjson = orjson
+
+    for name, seconds in results.items():
+        print(f"{name:<22} {seconds:8.3f}s  {args.events / seconds:>12,.0f} events/s")